@@ -0,0 +1,208 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+# Replays synthetic messages through Bot.on_message without connecting to Discord
+# Usage: python -m benchmarks.dispatch [--messages 20000] [--output results.json]
+#
+# The bot runs against a temporary database and an HTTP client which answers every
+# request locally, so everything from on_message to the command's reply is real
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import pathlib
+from typing import Any, Dict, List, Tuple
+
+try:
+    import config
+except ImportError:  # Use the example config, the token isn't needed
+    import config_example as config
+
+    sys.modules["config"] = config
+
+import discord
+
+import bot as bot_module
+from utils.fakegateway import BOT_ID, FakeGateway, message_payload, snowflake
+from utils.ratelimit import TokenBuckets
+from utils.storage import Storage
+
+
+class BenchBot(bot_module.Bot):
+    path: pathlib.Path
+
+    @property
+    def datapath(self) -> pathlib.Path:
+        return self.path
+
+
+CHAT = "just chatting about nothing in particular"
+
+
+def build_workload(
+    args: argparse.Namespace, rnd: random.Random
+) -> Tuple[List[Tuple[int, int, str]], Dict[str, Any]]:
+    """Make the guilds' prefixes, tags and blacklist, then the messages to replay"""
+    guilds = [snowflake() for _ in range(args.guilds)]
+    custom = {g: ["?", "yes "] for g in guilds if rnd.random() < args.prefix_mix}
+    tags = {g: [f"tag{i}" for i in range(args.tags)] for g in guilds}
+    authors = [snowflake() for _ in range(args.users)]
+    blacklisted = set(rnd.sample(authors, min(args.blacklist, len(authors))))
+    default = config.prefixes[0]
+    messages = []
+    for _ in range(args.messages):
+        guild = rnd.choice(guilds)
+        prefix = rnd.choice(custom.get(guild, [default]))
+        roll = rnd.random()
+        if roll >= args.command_ratio:
+            content = CHAT
+        elif rnd.random() < args.tag_ratio:
+            name = rnd.choice(tags[guild]) if rnd.random() < args.tag_hit_ratio else "nope"
+            content = f"{prefix}tag {name}"
+        else:
+            content = f"{prefix}ping"
+        messages.append((guild, rnd.choice(authors), content))
+    return messages, {"guilds": guilds, "custom": custom, "tags": tags, "blacklisted": blacklisted}
+
+
+async def seed(path: pathlib.Path, world: Dict[str, Any]) -> None:
+    """Fill the database before the bot starts, the way it'd be after running for a while"""
+    storage = Storage(path)
+    await storage.connect()
+    async with storage.writer.connection() as conn:
+        async with conn.transaction():
+            raw = conn.raw_connection
+            await raw.executemany(
+                "INSERT INTO guild_prefixes (guild_id, prefixes) VALUES (?, ?)",
+                [(g, json.dumps(p)) for g, p in world["custom"].items()],
+            )
+            await raw.executemany(
+                "INSERT INTO blacklist (user_id, reason) VALUES (?, 'benchmark')",
+                [(u,) for u in world["blacklisted"]],
+            )
+            await raw.executemany(
+                "INSERT INTO tags (guild_id, name, author_id, response) VALUES (?, ?, ?, ?)",
+                [
+                    (g, n, BOT_ID, f"response for {n}")
+                    for g, names in world["tags"].items()
+                    for n in names
+                ],
+            )
+    await storage.close()
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rnd = random.Random(args.seed)
+    workload, world = build_workload(args, rnd)
+    with tempfile.TemporaryDirectory() as tmp:
+        BenchBot.path = pathlib.Path(tmp)
+        await seed(BenchBot.path, world)
+        bot = BenchBot()
+        if not args.limits:
+            # The workload is replayed far faster than real time, the limits would drop most of it
+            bot.user_buckets = bot.guild_buckets = TokenBuckets(rate=1e9, capacity=1e9)
+            bot.shed_expensive_lag = bot.shed_all_lag = float("inf")
+        dispatched = 0
+
+        async def on_command(ctx) -> None:
+            nonlocal dispatched
+            dispatched += 1
+
+        bot.add_listener(on_command)
+        gateway = FakeGateway(bot)
+        await gateway.login()
+        await bot.startup.wait()
+        state = bot._connection
+        channels = {}
+        for guild_id in world["guilds"]:
+            channel_id = snowflake()
+            channels[guild_id] = gateway.add_guild(guild_id, channel_id).get_channel(channel_id)
+        messages = [
+            discord.Message(
+                state=state,
+                channel=channels[g],
+                data=message_payload(channels[g].id, author, content, guild_id=g),
+            )
+            for g, author, content in workload
+        ]
+        for msg in messages[: args.warmup]:
+            await bot.on_message(msg)
+        timings = []
+        dispatched = 0
+        start = time.perf_counter()
+        for msg in messages:
+            t = time.perf_counter()
+            await bot.on_message(msg)
+            timings.append(time.perf_counter() - t)
+        elapsed = time.perf_counter() - start
+        await bot.close()
+        await bot.storage.close()
+    expected = sum(
+        content != CHAT and author not in world["blacklisted"] for _, author, content in workload
+    )
+    if dispatched != expected and not args.limits:
+        raise SystemExit(
+            f"Only {dispatched} of {expected} commands were dispatched, the results would be wrong"
+        )
+    timings.sort()
+    return {
+        "messages": len(messages),
+        "elapsed_s": round(elapsed, 4),
+        "msgs_per_sec": round(len(messages) / elapsed, 1),
+        "p50_ms": round(timings[len(timings) // 2] * 1000, 4),
+        "p99_ms": round(timings[int(len(timings) * 0.99)] * 1000, 4),
+        "mean_ms": round(statistics.fmean(timings) * 1000, 4),
+        "commands_expected": expected,
+        "commands_dispatched": dispatched,
+        "http_requests": gateway.http.requests,
+        "startup_ms": {k: round(v * 1000, 1) for k, v in bot.startup.durations().items()},
+        "startup_total_ms": round(bot.startup.total * 1000, 1),
+        "params": vars(args),
+        "python": platform.python_version(),
+        "discord.py": discord.__version__,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the message dispatch path offline")
+    parser.add_argument("--messages", type=int, default=20_000)
+    parser.add_argument("--warmup", type=int, default=1_000)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument("--users", type=int, default=5_000)
+    parser.add_argument("--tags", type=int, default=50, help="Tags per guild")
+    parser.add_argument(
+        "--prefix-mix", type=float, default=0.3, help="Share of guilds with custom prefixes"
+    )
+    parser.add_argument(
+        "--command-ratio", type=float, default=0.1, help="Share of messages that are commands"
+    )
+    parser.add_argument(
+        "--tag-ratio", type=float, default=0.7, help="Share of commands that are tags"
+    )
+    parser.add_argument("--tag-hit-ratio", type=float, default=0.9)
+    parser.add_argument("--blacklist", type=int, default=100, help="Blacklisted users")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--limits", action="store_true", help="Keep the rate limits and load shedding on"
+    )
+    parser.add_argument("--output", type=pathlib.Path, help="Write the results here as JSON too")
+    args = parser.parse_args()
+    if not config.prefixes:
+        # Without one the bot only answers mentions, give it the prefix the workload uses
+        config.prefixes = ["!"]
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, default=str))
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,218 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+# Fires bursts of command replies and ticks at a local fake Discord, once straight
+# through discord.py and once through the outbound scheduler
+# Usage: python -m benchmarks.outbound [--channels 10] [--burst 20] [--output results.json]
+#
+# The fake server enforces per channel buckets the way Discord does (with the windows
+# scaled down) and answers 429 when a bucket is overrun, so discord.py's own rate limit
+# handling is part of what's measured
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime
+import json
+import platform
+import statistics
+import time
+import pathlib
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+import discord
+from aiohttp import web
+
+from utils.fakegateway import BOT_ID, message_payload, snowflake, user_payload
+from utils.outbound import OutboundScheduler
+
+TICK = "\N{WHITE HEAVY CHECK MARK}"
+
+
+def json_response(data: Any, *, status: int = 200, headers: Dict[str, str] = None) -> web.Response:
+    # discord.py only decodes the body when the content type is exactly this, no charset
+    headers = {**(headers or {}), "Content-Type": "application/json"}
+    return web.Response(body=json.dumps(data).encode(), status=status, headers=headers)
+
+
+class FakeDiscord:
+    """A tiny HTTP server with fixed window buckets per (route, channel)"""
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]]):
+        self.limits = limits  # route name -> (requests, per seconds)
+        self.windows: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        self.requests: Dict[str, int] = {}
+        self.ratelimited = 0
+        self.app = web.Application()
+        self.app.add_routes(
+            [
+                web.get("/api/v10/users/@me", self.me),
+                web.post("/api/v10/channels/{channel}/messages", self.create_message),
+                web.patch("/api/v10/channels/{channel}/messages/{message}", self.edit_message),
+                web.put(
+                    "/api/v10/channels/{channel}/messages/{message}/reactions/{emoji}/@me",
+                    self.add_reaction,
+                ),
+            ]
+        )
+
+    def _check(self, name: str, channel: str) -> Tuple[bool, Dict[str, str]]:
+        self.requests[name] = self.requests.get(name, 0) + 1
+        limit, per = self.limits[name]
+        now = time.monotonic()
+        start, used = self.windows.get((name, channel), (now, 0))
+        if now - start >= per:
+            start, used = now, 0
+        reset_after = per - (now - start)
+        headers = {
+            "X-RateLimit-Limit": str(limit),
+            "X-RateLimit-Bucket": name,
+            "X-RateLimit-Reset-After": f"{reset_after:.3f}",
+            "X-RateLimit-Reset": f"{time.time() + reset_after:.3f}",
+        }
+        if used >= limit:
+            self.ratelimited += 1
+            headers.update({"X-RateLimit-Remaining": "0", "X-RateLimit-Scope": "user"})
+            return False, headers
+        self.windows[(name, channel)] = (start, used + 1)
+        headers["X-RateLimit-Remaining"] = str(limit - used - 1)
+        return True, headers
+
+    def _respond(self, name: str, request: web.Request, body: Callable[[], Any]) -> web.Response:
+        ok, headers = self._check(name, request.match_info["channel"])
+        if not ok:
+            retry_after = float(headers["X-RateLimit-Reset-After"])
+            data = {
+                "message": "You are being rate limited.",
+                "retry_after": retry_after,
+                "global": False,
+            }
+            return json_response(data, status=429, headers=headers)
+        data = body()
+        if data is None:
+            return web.Response(status=204, headers=headers)
+        return json_response(data, headers=headers)
+
+    async def me(self, request: web.Request) -> web.Response:
+        return json_response(user_payload(BOT_ID, bot=True))
+
+    async def create_message(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        channel = int(request.match_info["channel"])
+        content = payload.get("content") or ""
+        return self._respond(
+            "messages", request, lambda: message_payload(channel, BOT_ID, content, bot=True)
+        )
+
+    async def edit_message(self, request: web.Request) -> web.Response:
+        payload = await request.json()
+        channel = int(request.match_info["channel"])
+        content = payload.get("content") or ""
+        return self._respond(
+            "messages", request, lambda: message_payload(channel, BOT_ID, content, bot=True)
+        )
+
+    async def add_reaction(self, request: web.Request) -> web.Response:
+        return self._respond("reactions", request, lambda: None)
+
+
+async def burst(
+    client: discord.Client,
+    args: argparse.Namespace,
+    reply: Callable[[discord.abc.Messageable, str], Awaitable[Any]],
+    tick: Callable[[discord.PartialMessage], Awaitable[Any]],
+) -> Dict[str, Any]:
+    """Every channel gets ``burst`` commands at once, each replies and then ticks"""
+    reply_latency: List[float] = []
+    failed = {"replies": 0, "ticks": 0}  # discord.py gives up after a few 429s in a row
+    start = time.perf_counter()
+
+    async def command(channel: discord.PartialMessageable, n: int) -> None:
+        t = time.perf_counter()
+        try:
+            await reply(channel, f"Reply number {n} tbh.")
+        except discord.HTTPException:
+            failed["replies"] += 1
+        else:
+            reply_latency.append(time.perf_counter() - t)
+        try:
+            await tick(channel.get_partial_message(snowflake()))
+        except discord.HTTPException:
+            failed["ticks"] += 1
+
+    channels = [client.get_partial_messageable(snowflake()) for _ in range(args.channels)]
+    await asyncio.gather(*(command(c, n) for c in channels for n in range(args.burst)))
+    elapsed = time.perf_counter() - start
+    reply_latency.sort()
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "reply_p50_ms": round(reply_latency[len(reply_latency) // 2] * 1000, 1),
+        "reply_p95_ms": round(reply_latency[int(len(reply_latency) * 0.95)] * 1000, 1),
+        "reply_mean_ms": round(statistics.fmean(reply_latency) * 1000, 1),
+        "failed": failed,
+    }
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    for mode in ("direct", "scheduled"):
+        fake = FakeDiscord(
+            {
+                "messages": (args.message_limit, args.message_window),
+                "reactions": (1, args.reaction_window),
+            }
+        )
+        runner = web.AppRunner(fake.app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        discord.http.Route.BASE = f"http://127.0.0.1:{port}/api/v10"
+        client = discord.Client(intents=discord.Intents.none())
+        await client.http.static_login("fake-token")  # Just the session, no application info
+        if mode == "direct":
+            stats = await burst(
+                client, args, lambda c, m: c.send(m), lambda msg: msg.add_reaction(TICK)
+            )
+        else:
+            outbound = OutboundScheduler()
+            stats = await burst(client, args, outbound.send, lambda msg: outbound.react(msg, TICK))
+            stats["merged"] = outbound.merged
+        stats["http_requests"] = dict(fake.requests)
+        stats["http_429s"] = fake.ratelimited
+        results[mode] = stats
+        await client.http.close()
+        await runner.cleanup()
+    return {
+        **results,
+        "params": vars(args),
+        "python": platform.python_version(),
+        "discord.py": discord.__version__,
+        "date": datetime.date.today().isoformat(),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark outbound sends against a rate limited fake Discord"
+    )
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--burst", type=int, default=20, help="Commands per channel, all at once")
+    parser.add_argument(
+        "--message-limit", type=int, default=5, help="Messages per window per channel"
+    )
+    parser.add_argument("--message-window", type=float, default=1.0, help="Seconds")
+    parser.add_argument(
+        "--reaction-window", type=float, default=0.25, help="Seconds between reactions"
+    )
+    parser.add_argument("--output", type=pathlib.Path, help="Write the results here as JSON too")
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, default=str))
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
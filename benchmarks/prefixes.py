@@ -0,0 +1,123 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+# Compares finding a message's prefix the way on_message used to, with the guild's
+# prefix list going through when_mentioned_or and then discord.py's startswith scan,
+# against the compiled prefix matchers
+# Usage: python -m benchmarks.prefixes [--messages 200000] [--output results.json]
+#
+# Only prefix resolution is timed. Before the matchers every message also went on to
+# the blacklist and get_context, benchmarks.dispatch covers the whole path
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import pathlib
+import random
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import discord
+from discord.ext import commands
+
+from utils.fakegateway import BOT_ID, snowflake
+from utils.prefixes import PrefixMatcher
+
+DEFAULT = ["!"]
+CUSTOM = ["?", "yes ", "!!"]
+CHAT = "just chatting about nothing in particular"
+
+Message = Tuple[int, str]
+
+
+def build_workload(
+    args: argparse.Namespace, rnd: random.Random
+) -> Tuple[List[Message], Dict[int, List[str]]]:
+    guilds = [snowflake() for _ in range(args.guilds)]
+    custom = {g: CUSTOM for g in guilds if rnd.random() < args.prefix_mix}
+    messages = []
+    for _ in range(args.messages):
+        guild = rnd.choice(guilds)
+        roll = rnd.random()
+        if roll >= args.command_ratio:
+            content = CHAT
+        elif roll < args.command_ratio * 0.1:
+            content = f"<@{BOT_ID}> ping"
+        else:
+            content = f"{rnd.choice(custom.get(guild, DEFAULT))}ping"
+        messages.append((guild, content))
+    return messages, custom
+
+
+def timeit(func: Callable[[Message], Optional[str]], messages: List[Message]) -> Tuple[float, int]:
+    for msg in messages[:1000]:
+        func(msg)
+    found = 0
+    start = time.perf_counter()
+    for msg in messages:
+        if func(msg) is not None:
+            found += 1
+    return time.perf_counter() - start, found
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    rnd = random.Random(args.seed)
+    messages, custom = build_workload(args, rnd)
+    # Both caches are plain dicts so only the work done per message differs
+    prefixes: Dict[int, List[str]] = {g: custom.get(g, []) for g, _ in messages}
+    matchers = {g: PrefixMatcher(p) for g, p in custom.items()}
+    default_matcher = PrefixMatcher(DEFAULT)
+    bot = SimpleNamespace(user=SimpleNamespace(id=BOT_ID))
+
+    def before(msg: Message) -> Optional[str]:
+        guild_id, content = msg
+        base = prefixes.get(guild_id) or DEFAULT
+        candidates = commands.when_mentioned_or(*base)(bot, msg)
+        return next((p for p in candidates if content.startswith(p)), None)
+
+    def after(msg: Message) -> Optional[str]:
+        guild_id, content = msg
+        return matchers.get(guild_id, default_matcher).match(content, BOT_ID)
+
+    before_s, before_found = timeit(before, messages)
+    after_s, after_found = timeit(after, messages)
+    if before_found != after_found:
+        raise SystemExit(f"The matchers found {after_found} commands instead of {before_found}")
+    return {
+        "messages": len(messages),
+        "commands": after_found,
+        "before_msgs_per_sec": round(len(messages) / before_s, 1),
+        "after_msgs_per_sec": round(len(messages) / after_s, 1),
+        "speedup": round(before_s / after_s, 2),
+        "params": vars(args),
+        "python": platform.python_version(),
+        "discord.py": discord.__version__,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Benchmark prefix resolution before and after the matchers"
+    )
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--guilds", type=int, default=100)
+    parser.add_argument(
+        "--prefix-mix", type=float, default=0.3, help="Share of guilds with custom prefixes"
+    )
+    parser.add_argument(
+        "--command-ratio", type=float, default=0.1, help="Share of messages that are commands"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=pathlib.Path, help="Write the results here as JSON too")
+    args = parser.parse_args()
+    results = run(args)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, default=str))
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
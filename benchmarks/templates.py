@@ -0,0 +1,100 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+# Compares sending a static tag, a compiled template tag and a template which is parsed
+# every time it's used, all through discord.py's send path against a local HTTP stub
+# Usage: python -m benchmarks.templates [--iterations 20000] [--output results.json]
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import pathlib
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+import discord
+
+from utils.fakegateway import FakeGateway, snowflake
+from utils.templates import compile_template
+
+STATIC = "Read the docs before asking, they're pinned in #help. Still stuck? Ask away tbh."
+TEMPLATE = (
+    "Hey {user}, read the docs before asking{if args} about {args}{end}, they're pinned "
+    "in {channel}. Still stuck? Ask away in {guild} tbh."
+)
+
+
+async def timeit(func: Callable[[], Awaitable[Any]], iterations: int) -> float:
+    for _ in range(min(1000, iterations)):
+        await func()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        await func()
+    return (time.perf_counter() - start) / iterations
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    client = discord.Client(intents=discord.Intents.none())
+    gateway = FakeGateway(client)
+    await gateway.login()
+    channel_id = snowflake()
+    guild = gateway.add_guild(snowflake(), channel_id)
+    channel = guild.get_channel(channel_id)
+    env = {"user": guild.me, "guild": guild, "channel": channel, "args": "templates"}
+    template = compile_template(TEMPLATE)
+    render = lambda: template.render(**env)
+
+    async def send_static() -> None:
+        await channel.send(STATIC)
+
+    async def send_compiled() -> None:
+        await channel.send(render())
+
+    async def send_parsed() -> None:
+        parsed = compile_template(TEMPLATE)
+        await channel.send(parsed.render(**env))
+
+    async def render_only() -> None:
+        render()
+
+    async def parse_only() -> None:
+        compile_template(TEMPLATE)
+
+    results = {
+        name: await timeit(func, args.iterations)
+        for name, func in (
+            ("send_static", send_static),
+            ("send_compiled", send_compiled),
+            ("send_parsed_per_call", send_parsed),
+            ("render_only", render_only),
+            ("parse_only", parse_only),
+        )
+    }
+    await client.close()
+    return {
+        **{f"{k}_us": round(v * 1e6, 2) for k, v in results.items()},
+        "compiled_vs_static": round(results["send_compiled"] / results["send_static"], 3),
+        "parsed_vs_static": round(results["send_parsed_per_call"] / results["send_static"], 3),
+        "rendered": render(),
+        "params": vars(args),
+        "python": platform.python_version(),
+        "discord.py": discord.__version__,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark tag templates against static tags")
+    parser.add_argument("--iterations", type=int, default=20_000)
+    parser.add_argument("--output", type=pathlib.Path, help="Write the results here as JSON too")
+    args = parser.parse_args()
+    results = asyncio.run(run(args))
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2, default=str))
+    print(json.dumps(results, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,173 +4,529 @@
 from __future__ import annotations
 
 import asyncio
+import functools
 import json
 import logging.handlers
+import queue
 import sys
+import time
+from collections import OrderedDict
 from contextlib import contextmanager
+from contextvars import ContextVar
+from multiprocessing.connection import Connection
 import pathlib
-from typing import TYPE_CHECKING, Iterable, List, Optional, Type, TypeVar, Union, Any
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+)
 
 import discord  # discord tbh
-from databases import Database
 from discord.ext import commands  # type:ignore
 
 import config
 import statements
 from utils import Context
+from utils.expiry import ExpiryScheduler
+from utils.ipc import ClusterIPC
+from utils.logs import JSONFormatter, LazyQueueHandler, SamplingFilter
+from utils.fakegateway import FakeGateway
+from utils.metrics import MetricsRegistry
+from utils.outbound import OutboundScheduler
+from utils.paginator import Paginator
+from utils.prefixes import PrefixMatcher
+from utils.ratelimit import TokenBuckets
+from utils.startup import Startup, StartupError
+from utils.storage import Storage
+from utils.writebehind import WriteBehind
 
 log = logging.getLogger(__file__)
 log.setLevel(logging.DEBUG)
 CTX = TypeVar("CTX")
+# The message on_message is handling and its guild's matcher, so the prefix callback
+# doesn't look the matcher up a second time for it
+_matched: ContextVar[Optional[Tuple[int, PrefixMatcher]]] = ContextVar("matched", default=None)
 extensions: List[str] = [f"cogs.{ext}" for ext in ("general", "blacklist", "tags")]
 
 
 @contextmanager
-def init_logging():
-    try:
-        logging.getLogger("discord").setLevel(logging.INFO)
-        logging.getLogger("discord.http").setLevel(logging.WARNING)
-        logging.getLogger("discord.gateway").setLevel(logging.WARNING)
-        log = logging.getLogger()
-        log.setLevel(logging.INFO)
-        handler = logging.handlers.RotatingFileHandler(
-            filename="yesbot.log", maxBytes=1_000_000, encoding="utf-8", mode="w"
-        )
+def init_logging(filename: str = "yesbot.log"):
+    # Records are only queued on the event loop's thread. Formatting them and writing
+    # them out happens on the listener's thread so a slow disk never blocks the bot
+    logging.getLogger("discord").setLevel(logging.INFO)
+    logging.getLogger("discord.http").setLevel(logging.WARNING)
+    logging.getLogger("discord.gateway").setLevel(logging.WARNING)
+    log = logging.getLogger()
+    log.setLevel(logging.INFO)
+    if getattr(config, "log_json", False):
+        fmt = JSONFormatter()
+    else:
         dt_fmt = "%Y-%m-%d %H:%M:%S"
         fmt = logging.Formatter("[{asctime}] [{levelname}] {name}: {message}", dt_fmt, style="{")
-        handler.setFormatter(fmt)
-        log.addHandler(handler)
-        stdout = logging.StreamHandler(sys.stdout)
-        stdout.setFormatter(fmt)
-        log.addHandler(stdout)
+    handlers = [
+        logging.handlers.RotatingFileHandler(
+            filename=filename, maxBytes=1_000_000, encoding="utf-8", mode="w"
+        ),
+        logging.StreamHandler(sys.stdout),
+    ]
+    for hndl in handlers:
+        hndl.setFormatter(fmt)
+    queue_handler = LazyQueueHandler(queue.SimpleQueue())
+    if sampling := getattr(config, "log_sampling", None):
+        queue_handler.addFilter(SamplingFilter(sampling))
+    listener = logging.handlers.QueueListener(
+        queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    log.addHandler(queue_handler)
+    listener.start()
+    try:
         yield
     finally:
-        handlers = log.handlers[:]
+        listener.stop()  # Writes out whatever is still queued
+        log.removeHandler(queue_handler)
         for hndl in handlers:
             hndl.close()
-            log.removeHandler(hndl)
 
 
 class PrefixManager:
     def __init__(self, bot: Bot, loop: asyncio.AbstractEventLoop = None):
         self.loop = loop or asyncio.get_event_loop()
         self.bot = bot
-        self.cursor = Database(f"sqlite:///{self.bot.datapath}/prefixes.db")
-        self._cache: Dict[int, List[str]] = {}
-        self.loop.create_task(self.initialize())
+        self.cursor = self.bot.storage.writer
+        self.reader = self.bot.storage.reader
+        # Guilds without custom prefixes are cached as an empty list so that
+        # resolving prefixes on every message never has to hit the database
+        self._cache: OrderedDict[int, List[str]] = OrderedDict()
+        self._matchers: Dict[int, PrefixMatcher] = {}
+        self.default_matcher = PrefixMatcher(config.prefixes)
+        self.max_size: int = getattr(config, "prefix_cache_size", 10_000)
+        self.hits: int = 0
+        self.misses: int = 0
+        self.writer: Optional[WriteBehind] = None
+        if getattr(config, "write_behind", False):
+            self.writer = WriteBehind(self.cursor, loop=self.loop)
+        self.bot.storage.coherence.register("prefixes", self.apply_changes)
 
     async def initialize(self) -> None:
-        await self.cursor.connect()
-        await self.cursor.execute(statements.CREATE_PREFIX_TABLE)
+        await self.bot.storage.wait_until_connected()
+        await self._load_all()
+        if self.writer:
+            self.writer.start()
+
+    async def _load_all(self) -> None:
+        data = await self.reader.fetch_all(statements.SELECT_ALL_PREFIXES)
+        for row in data:
+            self._set(row["guild_id"], json.loads(row["prefixes"]))
+
+    async def apply_changes(self, keys: Optional[Set[Tuple[int, str]]]) -> None:
+        """Drop guilds whose prefixes were changed by another process so they're fetched again"""
+        if keys is None:
+            self._cache.clear()
+            self._matchers.clear()
+            return await self._load_all()
+        for guild_id, _ in keys:
+            if self._cache.pop(guild_id, None) is not None:
+                self._matchers.pop(guild_id, None)
+
+    def _set(self, guild_id: int, prefixes: List[str]) -> None:
+        self._cache[guild_id] = prefixes
+        self._cache.move_to_end(guild_id)
+        if prefixes:
+            self._matchers[guild_id] = PrefixMatcher(prefixes)
+        else:
+            self._matchers.pop(guild_id, None)
+        while len(self._cache) > self.max_size:
+            evicted, _ = self._cache.popitem(last=False)
+            self._matchers.pop(evicted, None)
 
     async def get_prefixes(self, guild_id: int) -> List[str]:
-        if not self._cache.get(guild_id):
-            data = await self.cursor.fetch_val(statements.SELECT_PREFIXES, {"guild_id": guild_id})
-            if not data:
-                return []
-            self._cache[guild_id] = json.loads(data)
-        return self._cache[guild_id]
+        try:
+            prefixes = self._cache[guild_id]
+        except KeyError:
+            self.misses += 1
+            data = await self.reader.fetch_val(statements.SELECT_PREFIXES, {"guild_id": guild_id})
+            prefixes = json.loads(data) if data else []
+            self._set(guild_id, prefixes)
+            return prefixes
+        self.hits += 1
+        self._cache.move_to_end(guild_id)
+        return prefixes
+
+    async def get_matcher(self, guild_id: Optional[int]) -> PrefixMatcher:
+        """Get the compiled prefix matcher for a guild, falling back to the default prefixes"""
+        if guild_id is None:
+            return self.default_matcher
+        if guild_id not in self._cache:
+            await self.get_prefixes(guild_id)
+        else:
+            self.hits += 1
+            self._cache.move_to_end(guild_id)
+        return self._matchers.get(guild_id, self.default_matcher)
 
     async def update_prefixes(self, guild_id: int, prefixes: List[str] = None) -> None:
         new = json.dumps(prefixes or [])
-        async with self.cursor.transaction() as tr:
-            await self.cursor.execute(
-                statements.UPSERT_PREFIXES, {"prefixes": new, "guild_id": guild_id}
-            )
-            if prefixes:
-                self._cache[guild_id] = prefixes
-            else:
-                self._cache.pop(guild_id, None)
+        values = {"prefixes": new, "guild_id": guild_id}
+        if self.writer:
+            self.writer.put(guild_id, statements.UPSERT_PREFIXES, values)
+            self._set(guild_id, prefixes or [])
+            return
+        async with self.cursor.transaction():
+            await self.cursor.execute(statements.UPSERT_PREFIXES, values)
+            self._set(guild_id, prefixes or [])
 
     async def teardown(self):
-        await self.cursor.disconnect()
+        if self.writer:
+            await self.writer.close()
 
 
 class BlacklistManager:
     def __init__(self, bot: Bot, loop: asyncio.AbstractEventLoop = None):
         self.loop = loop or asyncio.get_event_loop()
         self.bot = bot
-        self.cursor = Database(f"sqlite:///{self.bot.datapath}/blacklist.db")
-        self._cache: Dict[int, str] = {}
-        self.loop.create_task(self.initialize())
+        self.cursor = self.bot.storage.writer
+        self.reader = self.bot.storage.reader
+        # An immutable snapshot of the blacklisted ids which is swapped on every write,
+        # so checking a message's author is a plain set lookup
+        self._users: FrozenSet[int] = frozenset()
+        self.version: int = 0
+        self._sorted: Tuple[int, List[int]] = (-1, [])
+        # Reasons are only needed for `blacklist list` so they're loaded lazily
+        self._reasons: Optional[Dict[int, str]] = None
+        self.writer: Optional[WriteBehind] = None
+        if getattr(config, "write_behind", False):
+            self.writer = WriteBehind(self.cursor, loop=self.loop)
+        # Temporary entries, removed by one task as they run out
+        self.expiry = ExpiryScheduler(self._expire)
+        # Users being expired right now, anyone blacklisted again meanwhile is taken out
+        self._expiring: Set[int] = set()
+        self.bot.storage.coherence.register("blacklist", self.apply_changes)
 
     async def initialize(self):
-        await self.cursor.connect()
-        await self.cursor.execute(statements.CREATE_BLACKLIST_TABLE)
-        await self.get_blacklist()
+        await self.bot.storage.wait_until_connected()
+        await self._load_all()
+        if self.writer:
+            self.writer.start()
+        self.expiry.start()
+
+    async def _load_all(self) -> None:
+        data = await self.reader.fetch_all(statements.SELECT_BLACKLISTED_USERS)
+        self._swap(frozenset(row["user_id"] for row in data))
+        self._reasons = None
+        # Already sorted by expiry, so this is a heap without any sifting
+        expiries = await self.reader.fetch_all(statements.SELECT_BLACKLIST_EXPIRIES)
+        self.expiry.replace((row["user_id"], row["expires_at"]) for row in expiries)
+
+    async def _write(self, *batches: Tuple[str, List[Dict[str, Any]]]) -> None:
+        """Queue writes on the writer if there is one, otherwise run them in one transaction
+
+        Each batch is a query and the values for it, which are run with one ``executemany``
+        """
+        if self.writer:
+            for query, values in batches:
+                for value in values:
+                    self.writer.put(value["user_id"], query, value)
+            return
+        async with self.cursor.transaction():
+            for query, values in batches:
+                if values:
+                    await self.cursor.execute_many(query, values)
+
+    async def _expire(self, user_ids: List[int]) -> None:
+        now = time.time()
+        self._expiring.update(user_ids)
+        try:
+            # The delete skips rows that were extended or made permanent meanwhile
+            params = [{"user_id": user_id, "now": now} for user_id in user_ids]
+            await self._write((statements.DELETE_EXPIRED_BLACKLIST, params))
+        finally:
+            expired = self._expiring.intersection(user_ids)
+            self._expiring.difference_update(user_ids)
+        self._swap(self._users - expired)
+        if self._reasons is not None:
+            for user_id in expired:
+                self._reasons.pop(user_id, None)
+
+    async def apply_changes(self, keys: Optional[Set[Tuple[int, str]]]) -> None:
+        """Apply blacklist changes made by another process"""
+        if keys is None:
+            return await self._load_all()
+        user_ids = [user_id for user_id, _ in keys]
+        data = await self.reader.fetch_all(
+            statements.SELECT_BLACKLIST_IN, {"user_ids": json.dumps(user_ids)}
+        )
+        found = {row["user_id"]: row["reason"] for row in data}
+        for user_id in user_ids:
+            self.expiry.cancel(user_id)
+        for row in data:
+            if row["expires_at"] is not None:
+                self.expiry.schedule(row["user_id"], row["expires_at"])
+        self._swap((self._users - set(user_ids)) | found.keys())
+        self._expiring.difference_update(found)
+        if self._reasons is not None:
+            for user_id in user_ids:
+                self._reasons.pop(user_id, None)
+            self._reasons.update(found)
+
+    def _swap(self, users: FrozenSet[int]) -> None:
+        self._users = users
+        self.version += 1
+
+    def is_blacklisted(self, user_id: int) -> bool:
+        return user_id in self._users
+
+    def sorted_users(self) -> List[int]:
+        """The blacklisted ids in order, only sorted again after the blacklist changes"""
+        if self._sorted[0] != self.version:
+            self._sorted = (self.version, sorted(self._users))
+        return self._sorted[1]
 
     async def get_blacklist(self, user_id: int = None) -> Dict[int, str]:
         if not user_id:
-            if not self._cache: # starting up
-                data = await self.cursor.fetch_all("SELECT user_id, reason FROM blacklist;")
-                if not data:
-                    return {}
-                ret = {k: v for k, v in data}
-                self._cache = ret
-            return self._cache
-        elif ret := self._cache.get(user_id):
-            return {user_id: ret}
-        data = await self.cursor.fetch_val(statements.SELECT_BLACKLIST, {"user_id": user_id})
-        ret = {user_id: data}
-        self._cache[user_id] = data
-        return ret
-
-    async def add_to_blacklist(self, users: Iterable[int], reason: str) -> None:
+            if self._reasons is None:
+                data = await self.reader.fetch_all(statements.SELECT_ALL_BLACKLIST)
+                self._reasons = {row["user_id"]: row["reason"] for row in data}
+            return self._reasons
+        elif user_id not in self._users:
+            return {}
+        elif self._reasons is not None:
+            return {user_id: self._reasons[user_id]}
+        data = await self.reader.fetch_val(statements.SELECT_BLACKLIST, {"user_id": user_id})
+        return {user_id: data}
+
+    async def add_to_blacklist(
+        self, users: Iterable[int], reason: str, *, expires_at: Optional[float] = None
+    ) -> None:
+        """Blacklist users, until the unix timestamp ``expires_at`` if it's given"""
+        users = set(users)
+        values = [{"user_id": user, "reason": reason, "expires_at": expires_at} for user in users]
+        await self._write((statements.UPSERT_REASON, values))
+        for user in users:
+            if expires_at is None:
+                self.expiry.cancel(user)
+            else:
+                self.expiry.schedule(user, expires_at)
+        self._swap(self._users | users)
+        self._expiring.difference_update(users)
+        if self._reasons is not None:
+            self._reasons.update(dict.fromkeys(users, reason))
+
+    async def clear_blacklist(self) -> None:
+        """Unblacklist everyone"""
+        if self.writer:
+            await self.writer.flush()  # So nothing pending is written after the wipe
         async with self.cursor.transaction():
-            for user in users:
-                await self.cursor.execute(
-                    statements.UPSERT_REASON, {"user_id": user, "reason": reason}
-                )
-                self._cache[user] = reason
+            await self.cursor.execute(statements.CLEAR_BLACKLIST)
+        self.expiry.replace(())
+        self._expiring.clear()
+        self._swap(frozenset())
+        self._reasons = {}
 
     async def remove_from_blacklist(self, users: Iterable[int]) -> None:
-        async with self.cursor.transaction():
-            if not users:
-                await self.cursor.execute("DROP TABLE blacklist")
-                await self.cursor.execute(statements.CREATE_BLACKLIST_TABLE)
-                self._cache = {}
-                return
+        users = set(users)
+        if not users:
+            return
+        await self._write((statements.DELETE_BLACKLIST, [{"user_id": user} for user in users]))
+        for user in users:
+            self.expiry.cancel(user)
+        self._swap(self._users - users)
+        if self._reasons is not None:
             for user in users:
-                await self.cursor.execute(
-                    "DELETE FROM blacklist WHERE user_id=:user_id", {"user_id": user}
-                )
-                self._cache.pop(user_id, None)
+                self._reasons.pop(user, None)
+
+    async def sync_blacklist(self, users: Iterable[int], reason: str) -> Tuple[int, int]:
+        """Make the blacklist exactly ``users``, returns how many were added and removed
+
+        Only the difference from what's blacklisted already is written. Users who stay
+        keep their reasons and expiries, new ones get ``reason`` and no expiry
+        """
+        wanted = frozenset(users)
+        current = self._users
+        added, removed = wanted - current, current - wanted
+        if not added and not removed:
+            return 0, 0
+        if self.writer:
+            await self.writer.flush()  # Pending writes would land on top of the sync otherwise
+        async with self.cursor.transaction():
+            await self.cursor.execute_many(
+                statements.DELETE_BLACKLIST, [{"user_id": u} for u in removed]
+            )
+            await self.cursor.execute_many(
+                statements.UPSERT_REASON,
+                [{"user_id": u, "reason": reason, "expires_at": None} for u in added],
+            )
+        for user in removed:
+            self.expiry.cancel(user)
+        # Anything changed while the transaction ran is kept
+        self._swap((self._users - removed) | added)
+        self._expiring.difference_update(added)
+        if self._reasons is not None:
+            for user in removed:
+                self._reasons.pop(user, None)
+            self._reasons.update(dict.fromkeys(added, reason))
+        return len(added), len(removed)
+
+    async def teardown(self):
+        self.expiry.close()
+        if self.writer:
+            await self.writer.close()
+
 
+class Bot(commands.AutoShardedBot):
+    """A subclass of discord.ext.commands.AutoShardedBot
 
-class Bot(
-    commands.Bot
-):  # I doubt this bot will require sharding as this will be at most a semi-public bot tbh
-    """A subclass of discord.ext.commands.Bot"""
+    When started by the launcher each process only runs its own ``shard_ids`` and
+    talks to the other processes through :attr:`ipc`
+    """
 
     __author__ = "Jojo#7791"
     __version__ = "1.0.0.dev0"
 
-    def __init__(self):
-        self.prefix_manager = PrefixManager(self)
+    def __init__(
+        self,
+        *,
+        ipc_connection: Connection = None,
+        cluster_id: int = 0,
+        offline: bool = False,
+        **kwargs,
+    ):
+        self.offline = offline
+        self.gateway: Optional[FakeGateway] = None  # Only when offline
+        self.metrics = MetricsRegistry()
+        # The stores are made in setup_hook, once there's an event loop to make them on
+        self.storage: Storage
+        self.prefix_manager: PrefixManager
+        self.blacklist_manager: BlacklistManager
+        self.startup: Startup
 
         async def _prefix(bot: Bot, msg: discord.Message) -> List[str]:
-            base = config.prefixes
-            if msg.guild:
-                prefixes = await self.prefix_manager.get_prefixes(msg.guild.id)
-                base = prefixes or base
-            return commands.when_mentioned_or(*base)(
-                bot, msg
-            )  # Always gonna have the bot mention as a prefix :D
-
-        super().__init__(_prefix, help_command=None, intents=discord.Intents.all())
+            matched = _matched.get()
+            if matched is not None and matched[0] == msg.id:
+                matcher = matched[1]
+            else:
+                matcher = await self.prefix_manager.get_matcher(msg.guild and msg.guild.id)
+            # Always gonna have the bot mention as a prefix :D
+            return matcher.with_mentions(bot.user.id)
+
+        super().__init__(_prefix, help_command=None, intents=discord.Intents.all(), **kwargs)
+        self.ipc: Optional[ClusterIPC] = None
+        if ipc_connection is not None:
+            self.ipc = ClusterIPC(self, ipc_connection, cluster_id)
+        self.cluster_id = cluster_id
+        self.outbound = OutboundScheduler(max_queue=getattr(config, "outbound_queue", 50))
+        # Cogs register their page sources with this, it handles the buttons of every menu
+        self.pages = Paginator()
+        self.add_listener(self.pages.on_interaction, "on_interaction")
+        # Tokens refill per second, a user can burst up to the capacity
+        self.user_buckets = TokenBuckets(
+            rate=getattr(config, "user_rate", 0.5), capacity=getattr(config, "user_burst", 5)
+        )
+        self.guild_buckets = TokenBuckets(
+            rate=getattr(config, "guild_rate", 5.0), capacity=getattr(config, "guild_burst", 30)
+        )
+        # Seconds of event loop lag after which expensive commands, then all commands, are dropped
+        self.shed_expensive_lag: float = getattr(config, "shed_expensive_lag", 0.25)
+        self.shed_all_lag: float = getattr(config, "shed_all_lag", 1.0)
+        self.before_invoke(self._start_command_timer)
+        self.after_invoke(self._stop_command_timer)
+        self.metrics.gauge(
+            "cache_hits", lambda: self._cache_samples("hits"), "Cache hits by cache"
+        )
+        self.metrics.gauge(
+            "cache_misses", lambda: self._cache_samples("misses"), "Cache misses by cache"
+        )
+        self.metrics.gauge("outbound_queued", lambda: [((), len(self.outbound))], "Queued sends")
+        self.metrics.gauge(
+            "outbound_requests",
+            lambda: [((), self.outbound.requests)],
+            "Requests made by the outbound scheduler",
+        )
+        self.metrics.gauge(
+            "outbound_merged", lambda: [((), self.outbound.merged)], "Sends merged into another"
+        )
+        self.metrics.gauge(
+            "blacklisted_users",
+            lambda: [((), len(self.blacklist_manager._users))],
+            "Blacklisted users",
+        )
+        self.metrics.gauge(
+            "startup_stage_seconds",
+            lambda: [
+                ((("stage", name),), took) for name, took in self.startup.durations().items()
+            ],
+            "How long each startup stage took",
+        )
+
+    async def setup_hook(self) -> None:
+        self.storage = Storage(self.datapath, metrics=self.metrics)
+        self.prefix_manager = PrefixManager(self)
+        self.blacklist_manager = BlacklistManager(self)
+        startup = self.startup = Startup()
+        startup.add("storage", self.storage.connect, required=True)
+        startup.add("prefixes", self.prefix_manager.initialize, after=["storage"], required=True)
+        startup.add(
+            "blacklist", self.blacklist_manager.initialize, after=["storage"], required=True
+        )
         for ext in extensions:
-            try:
-                self.load_extension(ext)
-            except commands.ExtensionFailed as e:
-                log.exception("Failed to load extension %s", ext, exc_info=e)
-        self.blacklist_manager = BlacklistManager(self, self.loop)
-        self.tree = discord.app_commands.CommandTree(self)
+            # Cogs use the database in cog_load, so they can't be loaded without it
+            startup.add(ext, functools.partial(self.load_extension, ext), after=["storage"])
+        if (port := getattr(config, "metrics_port", None)) is not None:
+            serve = functools.partial(self.metrics.serve, port=port + self.cluster_id)
+            startup.add("metrics", serve)
+        if self.ipc:
+            self.ipc.start()
+        self.loop.create_task(self.metrics.monitor_loop_lag())
+        # Not awaited so that connecting to the gateway overlaps with all of this,
+        # on_message waits on the startup being ready instead
+        self.loop.create_task(self._run_startup())
+
+    async def _run_startup(self) -> None:
+        try:
+            await self.startup.run()
+        except StartupError as e:
+            log.critical("Could not start up, shutting down", exc_info=e)
+            log.info("Startup stages:\n%s", self.startup.report())
+            await self.close()
+            return
+        log.info("Started up in %.1fms\n%s", self.startup.total * 1000, self.startup.report())
 
     async def shutdown(self):
         await self.prefix_manager.teardown()
+        await self.blacklist_manager.teardown()
+        if tags := self.get_cog("Tags"):
+            await tags.tag_manager.teardown()
+        await self.storage.close()
+        self.outbound.close()
+        if self.ipc:
+            self.ipc.close()
         await self.close()
         sys.exit(0)
 
+    def _caches(self) -> Dict[str, Any]:
+        ret = {"prefixes": self.prefix_manager}
+        if tags := self.get_cog("Tags"):
+            ret["tags"] = tags.tag_manager
+        return ret
+
+    def _cache_samples(self, attr: str) -> List[Tuple[Tuple[Tuple[str, str], ...], int]]:
+        caches = self._caches()
+        return [((("cache", name),), getattr(cache, attr)) for name, cache in caches.items()]
+
+    async def _start_command_timer(self, ctx: Context) -> None:
+        ctx.started_at = time.perf_counter()
+
+    async def _stop_command_timer(self, ctx: Context) -> None:
+        if ctx.started_at is not None:
+            name = ctx.command.qualified_name
+            took = time.perf_counter() - ctx.started_at
+            self.metrics.observe("command_seconds", took, command=name)
+
     async def get_context(self, message: discord.Message, *, cls: Type[CTX] = Context) -> CTX:
         return await super().get_context(message, cls=cls)
 
@@ -189,9 +545,41 @@ class Bot(
     async def on_message(self, msg: discord.Message):
         if msg.author.bot:
             return
-        elif msg.author.id in await self.blacklist_manager.get_blacklist():
+        elif not self.startup.ready.is_set():
+            await self.startup.wait()  # Nothing below works until the stores are loaded
+        matcher = await self.prefix_manager.get_matcher(msg.guild and msg.guild.id)
+        if not matcher.match(msg.content, self.user.id):
+            return  # Not a command, don't bother with the blacklist or a context
+        elif self.blacklist_manager.is_blacklisted(msg.author.id):
             return
-        await self.process_commands(msg)
+        elif not self._is_owner_sync(msg.author.id) and not self._consume_tokens(msg):
+            self.metrics.inc("ratelimited")
+            return
+        token = _matched.set((msg.id, matcher))
+        try:
+            await self.process_commands(msg)
+        finally:
+            _matched.reset(token)
+
+    def _is_owner_sync(self, user_id: int) -> bool:
+        return user_id == self.owner_id or user_id in (self.owner_ids or ())
+
+    def _consume_tokens(self, msg: discord.Message) -> bool:
+        if not self.user_buckets.consume(msg.author.id):
+            return False
+        # The user's token is spent either way, it'll come back by itself
+        return msg.guild is None or self.guild_buckets.consume(msg.guild.id)
+
+    async def process_commands(self, msg: discord.Message) -> None:
+        ctx = await self.get_context(msg)
+        if ctx.command is not None and not self._is_owner_sync(msg.author.id):
+            lag = self.metrics.loop_lag
+            if lag >= self.shed_all_lag or (
+                lag >= self.shed_expensive_lag and ctx.command.extras.get("expensive")
+            ):
+                self.metrics.inc("commands_shed", command=ctx.command.qualified_name)
+                return
+        await self.invoke(ctx)
 
     async def on_command_error(self, ctx: Context, exception: BaseException) -> None:
         if isinstance(exception, commands.CommandNotFound):
@@ -210,10 +598,18 @@ class Bot(
                 "Please run this command in an nsfw channel"
             )  # Idk if I'm gonna have nsfw stuff yet
         else:
+            self.metrics.inc("command_errors", command=ctx.command.qualified_name)
             await ctx.send("I'm sorry! That command errored.")
             log.exception("Error in command '%s'", ctx.command.name, exc_info=exception)
 
     async def start(self, *args, **kwargs) -> None:
+        if self.offline:
+            # A fake gateway instead of Discord, messages come in through the IPC
+            log.info("Running offline")
+            self.gateway = FakeGateway(self)
+            await self.gateway.login()
+            self.gateway.connect()
+            await asyncio.Event().wait()
         await super().start(config.token, reconnect=True)
 
     @property
@@ -233,4 +629,4 @@ if __name__ == "__main__":
         async def test(interaction: discord.Interaction):
             await interaction.response.send_message("Hello father.")
 
-        bot.run()
+        bot.run(config.token, log_handler=None)  # init_logging has it covered
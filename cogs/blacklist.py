@@ -4,117 +4,69 @@
 from __future__ import annotations
 
 import datetime
-from typing import TYPE_CHECKING, Union
+import re
+import time
+from typing import TYPE_CHECKING, Optional
 
 import discord  # Lmao
 from discord.ext import commands  # type:ignore
 
 from utils import Context
-from utils.chat_formatting import pagify, box
+from utils.chat_formatting import box
+from utils.durations import parse_duration
+from utils.paginator import Page, PageSource
 import logging
 
 if TYPE_CHECKING:
     from bot import Bot
 
 log = logging.getLogger("blacklist")
+_FOR_FLAG = re.compile(r"(?:^|\s)--for\s+(\S+)")
+_USER_ID = re.compile(rb"\b\d{15,21}\b")
 
 
-class BlacklistPages:
-    def __init__(self, blacklist: List[str]):
-        self.pages = blacklist
-        self.max_pages = len(self.pages)
-        self.title = "Blacklist"
-
-    def get_page(self, index: int) -> str:
-        return self.pages[index]
-
-    async def format_page(self, menu: BlacklistMenu, page: str) -> Union[str, discord.Embed]:
-        ctx = menu.ctx
-        footer = f"Page {menu.current_page + 1}/{self.max_pages}"
-        if ctx.guild and not ctx.channel.permissions_for(ctx.me).embed_links:
-            return f"**{self.title}**\n{box(page, 'yml')}\n{footer}"
-        return discord.Embed(
-            title=self.title,
-            colour=0x00FFFF,
-            description=box(page, "yml"),
-            timestamp=datetime.datetime.now(tz=datetime.timezone.utc),
-        ).set_footer(text=footer)
-
-
-class BlacklistMenu(discord.ui.View):
-    def __init__(self, ctx: Context, source: BlacklistPages):
-        self.ctx = ctx
-        self.source = source
-        self.current_page: int = 0
-        self.msg: discord.Message = None
-        super().__init__()
-
-    async def on_timeout(self) -> None:
-        await self.msg.edit(view=None)
-
-    async def interaction_check(self, inter: discord.Interaction) -> bool:
-        if not await self.ctx.bot.is_owner(inter.user):
-            await inter.response.send_message("Only the bot owner can interact with this menu", ephemeral=True)
-            return False
-        return True
-
-    async def show_checked_page(self, page_number: int) -> None:
-        try:
-            if self.source.max_pages > page_number >= 0:
-                await self.show_page(page_number)
-            elif self.source.max_pages <= page_number:
-                await self.show_page(0)
-            elif 0 > page_number:
-                await self.show_page(self.source.max_pages - 1)
-        except IndexError:
-            pass
-
-    async def show_page(self, page_number: int) -> None:
-        page = self.source.get_page(page_number)
-        self.current_page = page_number
-        kwargs = await self._get_kwargs_from_page(page)
-        if not self.msg:
-            self.msg = await self.ctx.send(**kwargs)
-        await self.msg.edit(**kwargs)
-
-    async def _get_kwargs_from_page(self, page: str) -> dict:
-        data = await self.source.format_page(self, page)
-        ret = {"view": self}
-        if isinstance(data, str):
-            ret["content"] = data
-        else:
-            ret["embed"] = data
-        return ret
-
-    async def start(self) -> None:
-        await self.show_page(0)
-
-    @discord.ui.button(emoji="\N{BLACK LEFT-POINTING DOUBLE TRIANGLE}", style=discord.ButtonStyle.gray)
-    async def go_to_first_page(self, button: discord.ui.Button, inter: discord.Interaction):
-        await self.show_page(0)
-
-    @discord.ui.button(emoji="\N{BLACK LEFT-POINTING TRIANGLE}\N{VARIATION SELECTOR-16}", style=discord.ButtonStyle.gray)
-    async def go_to_previous_page(self, button: discord.ui.Button, inter: discord.Interaction):
-        await self.show_checked_page(self.current_page - 1)
-
-    @discord.ui.button(emoji="\N{HEAVY MULTIPLICATION X}\N{VARIATION SELECTOR-16}", style=discord.ButtonStyle.red)
-    async def stop_pages(self, button: discord.ui.Button, inter: discord.Interaction):
-        await self.msg.delete()
-        self.stop()
-
-    @discord.ui.button(emoji="\N{BLACK RIGHT-POINTING TRIANGLE}\N{VARIATION SELECTOR-16}", style=discord.ButtonStyle.gray)
-    async def go_to_next_page(self, button: discord.ui.Button, inter: discord.Interaction):
-        await self.show_checked_page(self.current_page + 1)
-
-    @discord.ui.button(emoji="\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE}", style=discord.ButtonStyle.gray)
-    async def go_to_last_page(self, button: discord.ui.Button, inter: discord.Interaction):
-        await self.show_checked_page(-1) # This is easier methinks
+class BlacklistPages(PageSource):
+    name = "blacklist"
+    title = "Blacklist"
+    denied = "Only the bot owner can interact with this menu"
+    per_page: int = 10
+
+    def __init__(self, bot: Bot):
+        self.bot = bot
+
+    async def check(self, inter: discord.Interaction, author_id: int) -> bool:
+        return await self.bot.is_owner(inter.user)
+
+    async def get_page(self, key: int, index: int, shown: Optional[Page] = None) -> Optional[Page]:
+        manager = self.bot.blacklist_manager
+        if not (users := manager.sorted_users()):
+            return None
+        max_pages = -(-len(users) // self.per_page)
+        index %= max_pages
+        reasons = await manager.get_blacklist()
+        lines = ["Blacklisted Users:"]
+        for user_id in users[index * self.per_page : (index + 1) * self.per_page]:
+            reason = reasons.get(user_id, "")
+            if len(reason) > 100:
+                reason = reason[:100] + "..."
+            if (expires_at := manager.expiry.deadlines.get(user_id)) is None:
+                lines.append(f"\t- {user_id}: {reason}")
+            else:
+                until = datetime.datetime.fromtimestamp(expires_at, datetime.timezone.utc)
+                lines.append(f"\t- {user_id}: {reason} (until {until:%Y-%m-%d %H:%M} UTC)")
+        return Page(index, max_pages, box("\n".join(lines), "yml"))
 
 
 class Blacklist(commands.Cog):
     def __init__(self, bot: Bot):
         self.bot = bot
 
+    async def cog_load(self) -> None:
+        self.bot.pages.register(BlacklistPages(self.bot))
+
+    async def cog_unload(self) -> None:
+        self.bot.pages.unregister(BlacklistPages.name)
+
     async def cog_check(self, ctx: Context) -> bool:
         return await self.bot.is_owner(ctx.author)
 
@@ -123,10 +75,19 @@ class Blacklist(commands.Cog):
         if not ctx.invoked_subcommand:
             await ctx.show_help()
 
-    @blacklist.command(name="add")
+    @blacklist.command(name="add", usage="<users...> [--for 7d] [reason]")
     async def blacklist_add(
         self, ctx: Context, users: commands.Greedy[discord.User], *, reason: str = None
     ):
+        """Blacklist users, for a while if `--for` is given (like `--for 7d` or `--for 1w2d`)"""
+        expires_at = None
+        if reason and (match := _FOR_FLAG.search(reason)):
+            if (duration := parse_duration(match.group(1))) is None:
+                return await ctx.send(
+                    "That's not a duration, try something like `7d` or `1w2d12h`"
+                )
+            expires_at = time.time() + duration
+            reason = (reason[: match.start()] + reason[match.end() :]).strip()
         if not users:
             return await ctx.show_help()
         for user in users:
@@ -139,7 +100,7 @@ class Blacklist(commands.Cog):
 
         reason = reason or "No reason provided"
         users = {u.id for u in users}
-        await self.bot.blacklist_manager.add_to_blacklist(users, reason)
+        await self.bot.blacklist_manager.add_to_blacklist(users, reason, expires_at=expires_at)
         await ctx.tick()
 
     @blacklist.command(name="remove", require_var_positional=True)
@@ -155,16 +116,32 @@ class Blacklist(commands.Cog):
         await self.bot.blacklist_manager.remove_from_blacklist(users)
         await ctx.tick()
 
-    @blacklist.command(name="list")
+    @blacklist.command(name="sync")
+    async def blacklist_sync(self, ctx: Context, *, reason: str = None):
+        """Make the blacklist match an attached file of user ids
+
+        Anyone blacklisted who isn't in the file is removed, so this is for keeping in
+        step with a shared ban list
+        """
+        if not ctx.message.attachments:
+            return await ctx.send("Attach a file of user ids to sync the blacklist to")
+        data = await ctx.message.attachments[0].read()
+        users = {int(user_id) for user_id in _USER_ID.findall(data)}
+        users -= {ctx.me.id, self.bot.owner_id, *(self.bot.owner_ids or ())}
+        if not users:
+            return await ctx.send("I couldn't find any user ids in that file")
+        added, removed = await self.bot.blacklist_manager.sync_blacklist(
+            users, reason or "Synced from a ban list"
+        )
+        await ctx.send(
+            f"Synced the blacklist to {len(users)} users: {added} added, {removed} removed"
+        )
+
+    @blacklist.command(name="list", extras={"expensive": True})
     async def blacklist_list(self, ctx: Context):
-        bl = await self.bot.blacklist_manager.get_blacklist()
-        if not bl:
-            return await ctx.send("There are no blacklisted users")
-        msg = "Blacklisted Users:\n"
-        msg += "\n".join(f"\t- {u_id}: {reason}" for u_id, reason in bl.items())
-        source = BlacklistPages(pagify(msg))
-        await BlacklistMenu(ctx, source).start()
+        if await self.bot.pages.start(ctx, BlacklistPages.name, 0) is None:
+            await ctx.send("There are no blacklisted users")
 
 
-def setup(bot: Bot):
-    bot.add_cog(Blacklist(bot))
+async def setup(bot: Bot):
+    await bot.add_cog(Blacklist(bot))
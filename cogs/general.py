@@ -3,13 +3,15 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, List
 
 import discord
 from discord.ext import commands
 
 from utils import Context
+from utils.chat_formatting import box, pagify
 
 if TYPE_CHECKING:
     from bot import Bot
@@ -42,8 +44,32 @@ class General(commands.Cog):
     @commands.is_owner()
     async def shutdown(self, ctx: Context):
         await ctx.send("Okay, I'm shutting down")
+        if self.bot.ipc:
+            return self.bot.ipc.broadcast("shutdown")
         await self.bot.shutdown()
 
+    @commands.command()
+    @commands.is_owner()
+    async def clusters(self, ctx: Context):
+        """Show the health of every cluster"""
+        if not self.bot.ipc:
+            return await ctx.send("I'm not running in clusters")
+        try:
+            data = await self.bot.ipc.request("health_report")
+        except asyncio.TimeoutError:
+            return await ctx.send("The launcher didn't answer")
+        lines = []
+        for cluster_id, health in sorted(data["clusters"].items()):
+            status = "up" if health["alive"] else "down"
+            latency = health.get("latency")
+            latency = "no latency" if latency is None else f"{latency}ms"  # None offline
+            lines.append(
+                f"Cluster {cluster_id} ({status}): shards {health.get('shard_ids')}, "
+                f"{health.get('guilds', 0)} guilds, {latency}, "
+                f"last seen {health['last_seen']}s ago"
+            )
+        await ctx.send(box("\n".join(lines)))
+
     @commands.Cog.listener()
     async def on_ready(self):
         log.info("Bot is online tbh imo fr")
@@ -63,16 +89,50 @@ class General(commands.Cog):
         await self.bot.user.edit(avatar=data)
         await ctx.tick()
 
+    @commands.command()
+    @commands.is_owner()
+    async def stats(self, ctx: Context):
+        """Show command latency, database timings, cache hit rates and event loop lag"""
+        metrics = self.bot.metrics
+
+        def summarize(name: str, label: str, limit: int = 8) -> List[str]:
+            series = metrics.histograms.get(name, {})
+            top = sorted(series.items(), key=lambda x: x[1].count, reverse=True)[:limit]
+            return [
+                f"  {dict(labels).get(label, '-')}: {hist.count} calls, "
+                f"avg {hist.sum / hist.count * 1000:.1f}ms, "
+                f"p50 <{hist.quantile(0.5) * 1000:g}ms, p99 <{hist.quantile(0.99) * 1000:g}ms"
+                for labels, hist in top
+            ]
+
+        lines = ["Commands:", *summarize("command_seconds", "command")]
+        lines += ["Database:", *summarize("db_query_seconds", "statement")]
+        lines.append("Caches:")
+        for name, cache in self.bot._caches().items():
+            total = cache.hits + cache.misses
+            rate = cache.hits / total * 100 if total else 0
+            lines.append(f"  {name}: {cache.hits} hits, {cache.misses} misses ({rate:.1f}%)")
+        lag = metrics.histograms.get("event_loop_lag_seconds", {}).get(())
+        p99 = f", p99 <{lag.quantile(0.99) * 1000:g}ms" if lag else ""
+        lines.append(f"Event loop lag: {metrics.loop_lag * 1000:.1f}ms now{p99}")
+        for page in pagify("\n".join(lines), 1900):
+            await ctx.send(box(page, "yml"))
+
     @commands.command(name="reload")
     @commands.is_owner()
     async def reload_cog(self, ctx: Context, cog_name: str):
-        self.bot.reload_extension(f"cogs.{cog_name}")
+        if self.bot.ipc:
+            self.bot.ipc.broadcast("reload", extension=f"cogs.{cog_name}")
+        else:
+            await self.bot.reload_extension(f"cogs.{cog_name}")
         await ctx.tick()
 
     async def _init(self) -> None:
         await self.bot.wait_until_ready()
+        if self.bot.offline:
+            return  # There's nowhere to sync to
         await self.bot.tree.sync()
 
 
-def setup(bot: Bot):
-    bot.add_cog(General(bot))
+async def setup(bot: Bot):
+    await bot.add_cog(General(bot))
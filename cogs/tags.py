@@ -4,199 +4,530 @@
 from __future__ import annotations
 
 import asyncio
-
-from databases import Database
-
-from pathlib import Path
+import csv
+import heapq
+import io
+import itertools
+import json
+import sys
+import tempfile
+from collections import Counter, OrderedDict
 
 import discord
 from discord.ext import commands # type:ignore
-from dataclasses import dataclass 
-import datetime
 
-from typing import TYPE_CHECKING, Optional, Union, Dict, Tuple, Any
+from typing import (
+    TYPE_CHECKING, Optional, Dict, List, Set, Tuple, Any, AsyncIterator, Iterable, Iterator, TextIO
+)
 import logging
 
+import config
+import statements
 from utils import Context
-from utils.chat_formatting import pagify, box
+from utils.chat_formatting import MESSAGE_LIMIT, box
+from utils.paginator import Page, PageSource
+from utils.search import TrigramIndex
+from utils.templates import Template, TemplateError, compile_template
+from utils.writebehind import WriteBehind
 
 if TYPE_CHECKING:
     from bot import Bot
 
 
-CREATE_TABLE: str = """CREATE TABLE IF NOT EXISTS
-    tags (
-        name TEXT PRIMARY KEY,
-        author_id INT NOT NULL,
-        guild_id INT NOT NULL,
-        response TEXT NOT NULL
-    )
-""".strip()
-SELECT_TAG: str = "SELECT author_id, response FROM tags WHERE name=:name AND guild_id=:guild_id"
-INSERT_TAG: str = """INSERT INTO
-tags
-    (name, author_id, response, guild_id)
-VALUES
-    (:name, :author_id, :response, :guild_id)
-"""
-
 log = logging.getLogger("tags")
+# How similar a tag name has to be to be suggested when a tag isn't found
+_SUGGESTION_THRESHOLD: float = 0.3
+# Rough per-tag cost of the dict slot, Tag object and string headers
+_TAG_OVERHEAD: int = 200
+_TEMPLATE_MENTIONS = discord.AllowedMentions(everyone=False, roles=False, users=False)
+
+
+class Tag:
+    """A single tag's data
+
+    Tags are stored in a nested ``{guild_id: {name: Tag}}`` mapping, so this only
+    holds what isn't already part of the keys. Responses with variables in them are
+    compiled when the tag is loaded or saved, so using the tag only has to render it
+    """
+
+    __slots__ = ("author_id", "response", "template")
+
+    def __init__(self, author_id: int, response: str):
+        self.author_id = author_id
+        self.response = response
+        try:
+            self.template: Optional[Template] = compile_template(response)
+        except TemplateError:
+            self.template = None  # Saved before tags had templates, send it as it is
+
+    def render(self, ctx: Context, args: str = "") -> str:
+        if self.template is None:
+            return self.response
+        ret = self.template.render(
+            user=ctx.author, guild=ctx.guild, channel=ctx.channel, args=args
+        )
+        return ret[:MESSAGE_LIMIT]
+
+    def __repr__(self) -> str:
+        return f"<Tag author_id={self.author_id} response={self.response!r}>"
+
+
+class UsageBoard:
+    """A guild's tag use counts along with its most used tags
+
+    The top ``k`` names are kept sorted as the counts change, so the leaderboard is
+    always ready without sorting every count
+    """
+
+    __slots__ = ("counts", "top", "k")
+
+    def __init__(self, counts: Dict[str, int], k: int = 10):
+        self.counts = counts
+        self.k = k
+        self.top: List[str] = heapq.nlargest(k, counts, key=counts.__getitem__)
+
+    def increment(self, name: str, amount: int = 1) -> None:
+        counts, top = self.counts, self.top
+        count = counts[name] = counts.get(name, 0) + amount
+        if name in top:
+            i = top.index(name)
+        elif len(top) < self.k:
+            top.append(name)
+            i = len(top) - 1
+        elif count > counts[top[-1]]:
+            top[-1] = name
+            i = len(top) - 1
+        else:
+            return
+        # It only ever moves up, so one pass of insertion sort puts it back in place
+        while i and counts[top[i - 1]] < count:
+            top[i - 1], top[i] = top[i], top[i - 1]
+            i -= 1
+
+    def remove(self, name: str) -> None:
+        if self.counts.pop(name, None) is not None and name in self.top:
+            self.top = heapq.nlargest(self.k, self.counts, key=self.counts.__getitem__)
+
+    def leaderboard(self) -> List[Tuple[str, int]]:
+        return [(name, self.counts[name]) for name in self.top]
 
 
 class TagManager:
-    """Manager class for tags"""
+    """Manager class for tags
+
+    Tags are loaded one guild at a time, the first time that guild uses a tag.
+    Loaded guilds are kept in an LRU which is trimmed to ``tag_cache_budget`` bytes
+    """
 
     def __init__(self, bot: Bot, loop: asyncio.AbstractEventLoop = None):
         self.loop = loop or asyncio.get_event_loop()
         self.bot = bot
-        self.cursor = Database(f"sqlite:///{self.bot.datapath}/tags.db")
-        self._cache: Dict[Tuple[str, int], Dict[str, Any]] = {}
-        self.loop.create_task(self.initialize())
+        self.cursor = self.bot.storage.writer
+        self.reader = self.bot.storage.reader
+        # One dict per guild instead of a tuple key per tag keeps the guild ids shared.
+        # A loaded guild holds all of its tags so a miss in it is a real miss
+        self._cache: OrderedDict[int, Dict[str, Tag]] = OrderedDict()
+        self._sizes: Dict[int, int] = {}
+        self._loading: Dict[int, asyncio.Future] = {}
+        # Built off the loop the first time a guild is searched, then kept in step with its
+        # tags. Their size counts towards the guild's in the cache budget
+        self._indexes: Dict[int, TrigramIndex] = {}
+        self._index_builds: Dict[int, asyncio.Future] = {}
+        # Loaded along with a guild's tags. Uses are counted here and in _pending_uses,
+        # which is flushed to the database every so often
+        self._boards: Dict[int, UsageBoard] = {}
+        self._pending_uses: Counter = Counter()
+        self._usage_lock = asyncio.Lock()
+        self._usage_task: Optional[asyncio.Task] = None
+        self._closing = asyncio.Event()
+        self.usage_flush_interval: float = getattr(config, "tag_usage_flush_interval", 60.0)
+        self.cached_bytes: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.budget: int = getattr(config, "tag_cache_budget", 64 * 1024 * 1024)
+        self.writer: Optional[WriteBehind] = None
+        if getattr(config, "write_behind", False):
+            self.writer = WriteBehind(self.cursor, loop=self.loop)
+        self.bot.storage.coherence.register("tags", self.apply_changes)
 
     async def initialize(self) -> None:
-        await self.cursor.connect()
-        await self.cursor.execute(CREATE_TABLE)
+        await self.bot.storage.wait_until_connected()
+        if self.writer:
+            self.writer.start()
+        self._usage_task = self.loop.create_task(self._usage_loop())
+
+    async def teardown(self) -> None:
+        if self._usage_task:
+            # Cancelling could land in the middle of a flush, so the loop is told to stop
+            # and does its last flush on the way out
+            self._closing.set()
+            await self._usage_task
+            self._usage_task = None
+        await self.flush_uses()
+        if self.writer:
+            await self.writer.close()
+
+    async def _usage_loop(self) -> None:
+        while not self._closing.is_set():
+            try:
+                await asyncio.wait_for(self._closing.wait(), timeout=self.usage_flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.flush_uses()
+            except Exception as e:
+                log.exception("Could not save tag uses", exc_info=e)
+
+    async def flush_uses(self) -> None:
+        """Add the uses counted since the last flush to the database"""
+        async with self._usage_lock:
+            if not self._pending_uses:
+                return
+            pending, self._pending_uses = self._pending_uses, Counter()
+            values = [
+                {"guild_id": guild_id, "name": name, "uses": uses}
+                for (guild_id, name), uses in pending.items()
+            ]
+            try:
+                async with self.cursor.transaction():
+                    await self.cursor.execute_many(statements.UPSERT_TAG_USAGE, values)
+            except BaseException:
+                # Cancelled or not, the counts go back to be saved with the next flush
+                self._pending_uses.update(pending)
+                raise
+
+    def record_use(self, name: str, guild_id: int) -> None:
+        """Count a use of a tag. This doesn't touch the database"""
+        self._pending_uses[(guild_id, name)] += 1
+        if (board := self._boards.get(guild_id)) is not None:
+            board.increment(name)
+
+    async def get_board(self, guild_id: int) -> UsageBoard:
+        await self._get_guild(guild_id)
+        return self._boards[guild_id]
+
+    async def _flush_pending(self) -> None:
+        # Anything read straight from the database has to see the writes still queued
+        if self.writer and len(self.writer):
+            await self.writer.flush()
+
+    @staticmethod
+    def _sizeof(name: str, tag: Tag) -> int:
+        size = _TAG_OVERHEAD + len(name) + len(tag.response)
+        if tag.template is not None:
+            # Roughly, the parts hold the same text again
+            size += _TAG_OVERHEAD + len(tag.response)
+        return size
+
+    async def _get_guild(self, guild_id: int) -> Dict[str, Tag]:
         try:
-            data = await self.cursor.fetch_all("SELECT name, guild_id, author_id, response FROM tags;")
+            guild = self._cache[guild_id]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            self._cache.move_to_end(guild_id)
+            return guild
+        self.misses += 1
+        if (fut := self._loading.get(guild_id)) is not None:
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise
+                # Whoever was loading it was cancelled, not this, so load it here instead
+                return await self._get_guild(guild_id)
+        fut = self._loading[guild_id] = self.loop.create_future()
+        try:
+            guild = await self._load_guild(guild_id)
         except Exception as e:
-            log.exception("Could not get data", exc_info=e)
-            return
-        if not data:
+            fut.set_exception(e)
+            raise
+        else:
+            fut.set_result(guild)
+        finally:
+            # Cancelling the load skips both of the above, anyone waiting on it would hang
+            if not fut.done():
+                fut.cancel()
+            del self._loading[guild_id]
+        return guild
+
+    async def _load_guild(self, guild_id: int) -> Dict[str, Tag]:
+        await self._flush_pending()
+        data = await self.reader.fetch_all(statements.SELECT_GUILD_TAGS, {"guild_id": guild_id})
+        guild = {sys.intern(row["name"]): Tag(row["author_id"], row["response"]) for row in data}
+        # The lock waits out a flush that's running, whose counts are in neither place yet
+        async with self._usage_lock:
+            uses = await self.reader.fetch_all(
+                statements.SELECT_GUILD_TAG_USAGE, {"guild_id": guild_id}
+            )
+            counts = {row["name"]: row["uses"] for row in uses if row["name"] in guild}
+            # Uses that haven't been flushed are added on top instead of flushing everyone's
+            for (pending_guild, name), count in self._pending_uses.items():
+                if pending_guild == guild_id and name in guild:
+                    counts[name] = counts.get(name, 0) + count
+        self._boards[guild_id] = UsageBoard(counts)
+        self._cache[guild_id] = guild
+        size = sum(self._sizeof(n, t) for n, t in guild.items())
+        self._sizes[guild_id] = size
+        self.cached_bytes += size
+        self._trim()
+        return guild
+
+    def _trim(self) -> None:
+        # Always keep the most recently used guild, even if it's over budget by itself
+        while self.cached_bytes > self.budget and len(self._cache) > 1:
+            guild_id, _ = self._cache.popitem(last=False)
+            self.cached_bytes -= self._sizes.pop(guild_id)
+            self._indexes.pop(guild_id, None)
+            self._boards.pop(guild_id, None)
+
+    def evict_guild(self, guild_id: int) -> None:
+        """Drop a guild's tags from the cache"""
+        if self._cache.pop(guild_id, None) is not None:
+            self.cached_bytes -= self._sizes.pop(guild_id)
+        self._indexes.pop(guild_id, None)
+        self._boards.pop(guild_id, None)
+
+    def _cache_put(self, guild_id: int, name: str, tag: Tag) -> None:
+        if (guild := self._cache.get(guild_id)) is None:
+            return  # It'll be loaded along with the rest of the guild's tags
+        name = sys.intern(name)
+        if (old := guild.get(name)) is not None:
+            self._sizes[guild_id] -= self._sizeof(name, old)
+            self.cached_bytes -= self._sizeof(name, old)
+        guild[name] = tag
+        size = self._sizeof(name, tag)
+        if (index := self._indexes.get(guild_id)) is not None:
+            before = index.nbytes
+            index.add(name)
+            size += index.nbytes - before
+        self._sizes[guild_id] += size
+        self.cached_bytes += size
+
+    def _cache_pop(self, guild_id: int, name: str) -> None:
+        if (guild := self._cache.get(guild_id)) is not None and (tag := guild.pop(name, None)):
+            size = self._sizeof(name, tag)
+            self._sizes[guild_id] -= size
+            self.cached_bytes -= size
+        if (index := self._indexes.get(guild_id)) is not None:
+            before = index.nbytes
+            index.remove(name)
+            self._sizes[guild_id] -= before - index.nbytes
+            self.cached_bytes -= before - index.nbytes
+        if (board := self._boards.get(guild_id)) is not None:
+            board.remove(name)
+
+    async def apply_changes(self, keys: Optional[Set[Tuple[int, str]]]) -> None:
+        """Update cached tags that were changed by another process"""
+        if keys is None:
+            for guild_id in list(self._cache):
+                self.evict_guild(guild_id)
             return
-        # I could do this in one line but uh, no
-        keys = ("author_id", "response")
-        for payload in data:
-            payload = list(payload)
-            name = payload.pop(0)
-            guild_id = payload.pop(0)
-            self._cache[(name, guild_id)] = {k: v for k, v in zip(keys, payload)}
-
-    async def get_tag(self, name: str, guild_id: int) -> Optional[dict]:
-        if not self._cache.get((name, guild_id)):
-            data = await self.cursor.fetch_one(SELECT_TAG, {"name": name, "guild_id": guild_id})
-            if not data:
-                return None
-            self._cache[(name, guild_id)] = {k: v for k, v in zip(("author_id", "response"), data)}
-            log.debug(f"{self._cache = }")
-        return self._cache[(name, guild_id)]
+        changed: Dict[int, List[str]] = {}
+        for guild_id, name in keys:
+            if guild_id in self._cache:
+                changed.setdefault(guild_id, []).append(name)
+        for guild_id, names in changed.items():
+            rows = await self.reader.fetch_all(
+                statements.SELECT_GUILD_TAGS_IN, {"guild_id": guild_id, "names": json.dumps(names)}
+            )
+            found = {row["name"]: Tag(row["author_id"], row["response"]) for row in rows}
+            for name in names:
+                if (tag := found.get(name)) is not None:
+                    self._cache_put(guild_id, name, tag)
+                else:
+                    self._cache_pop(guild_id, name)
+        self._trim()
+
+    async def get_tag(self, name: str, guild_id: int) -> Optional[Tag]:
+        guild = await self._get_guild(guild_id)
+        return guild.get(name)
 
     async def save_tag(self, name: str, author_id: int, response: str, guild_id: int) -> None:
-        async with self.cursor.transaction():
-            await self.cursor.execute(
-                INSERT_TAG, {"name": name, "author_id": author_id, "response": response, "guild_id": guild_id}
-            )
-        self._cache[(name, guild_id)] = {"author_id": author_id, "response": response}
+        values = {"name": name, "author_id": author_id, "response": response, "guild_id": guild_id}
+        if self.writer:
+            self.writer.put((guild_id, name), statements.UPSERT_TAG, values)
+        else:
+            async with self.cursor.transaction():
+                await self.cursor.execute(statements.INSERT_TAG, values)
+        self._cache_put(guild_id, name, Tag(author_id, response))
+        self._trim()
 
     async def delete_tag(self, name: str, guild_id: int) -> None:
-        async with self.cursor.transaction():
-            await self.cursor.execute(
-                "DELETE FROM tags WHERE name=:name AND guild_id=:guild_id",
-                {"name": name, "guild_id": guild_id},
+        values = {"name": name, "guild_id": guild_id}
+        self._pending_uses.pop((guild_id, name), None)
+        if self.writer:
+            self.writer.put((guild_id, name), statements.DELETE_TAG, values)
+            self.writer.put(("uses", guild_id, name), statements.DELETE_TAG_USAGE, values)
+        else:
+            async with self.cursor.transaction():
+                await self.cursor.execute(statements.DELETE_TAG, values)
+                await self.cursor.execute(statements.DELETE_TAG_USAGE, values)
+        self._cache_pop(guild_id, name)
+
+    async def search_tags(
+        self, query: str, guild_id: int, *, limit: int = 10, threshold: float = 0.0
+    ) -> List[Tuple[str, float]]:
+        """Fuzzy search a guild's tag names, returning ``(name, score)`` pairs best first"""
+        guild = await self._get_guild(guild_id)
+        if (index := self._indexes.get(guild_id)) is None:
+            index = await self._build_index(guild_id, guild)
+        return index.search(query, limit=limit, threshold=threshold)
+
+    async def _build_index(self, guild_id: int, guild: Dict[str, Tag]) -> TrigramIndex:
+        if (build := self._index_builds.get(guild_id)) is None:
+            # That's about half a second for 50k tags, so it's kept off the loop
+            build = self.loop.run_in_executor(None, TrigramIndex, list(guild))
+            self._index_builds[guild_id] = build
+            build.add_done_callback(lambda _: self._index_builds.pop(guild_id, None))
+        index = await asyncio.shield(build)
+        if guild_id in self._indexes or self._cache.get(guild_id) is not guild:
+            # Someone else waiting on it got here first, or the guild was dropped meanwhile
+            return self._indexes.get(guild_id, index)
+        # Catch up on tags that were saved or deleted while it was being built
+        for name in [name for name in index if name not in guild]:
+            index.remove(name)
+        for name in guild:
+            index.add(name)
+        self._indexes[guild_id] = index
+        self._sizes[guild_id] += index.nbytes
+        self.cached_bytes += index.nbytes
+        self._trim()
+        return index
+
+    async def count_tags(self, guild_id: int) -> int:
+        await self._flush_pending()
+        return await self.reader.fetch_val(statements.COUNT_GUILD_TAGS, {"guild_id": guild_id})
+
+    async def get_tags_page(
+        self,
+        guild_id: int,
+        *,
+        after: str = None,
+        before: str = None,
+        last: bool = False,
+        offset: int = 0,
+        limit: int = 15,
+    ) -> List[Tuple[str, str]]:
+        """Get a page of a guild's ``(name, response preview)`` pairs ordered by name
+
+        ``after`` and ``before`` are the names on either side of the page, ``last``
+        gets the final page. Otherwise the page starts ``offset`` tags in
+        """
+        await self._flush_pending()
+        values = {"guild_id": guild_id, "limit": limit}
+        if after is not None:
+            query = statements.SELECT_TAGS_AFTER
+            values["name"] = after
+        elif before is not None:
+            query = statements.SELECT_TAGS_BEFORE
+            values["name"] = before
+        elif last:
+            query = statements.SELECT_LAST_TAGS
+        else:
+            query = statements.SELECT_TAGS_OFFSET
+            values["offset"] = offset
+        data = await self.reader.fetch_all(query, values)
+        rows = [(row["name"], row["preview"]) for row in data]
+        if before is not None or last:
+            rows.reverse()
+        return rows
+
+    async def export_tags(
+        self, guild_id: int, *, chunk_size: int = 1000
+    ) -> AsyncIterator[List[Tuple[str, int, str]]]:
+        """Yield a guild's ``(name, author_id, response)`` rows a chunk at a time, by name"""
+        await self._flush_pending()
+        async with self.reader.connection() as conn:
+            cursor = await conn.raw_connection.execute(
+                statements.EXPORT_GUILD_TAGS, {"guild_id": guild_id}
             )
-        self._cache.pop((name, guild_id), None)
-
-    async def get_tags(self, guild_id: int) -> Optional[dict]:
-        data = await self.cursor.fetch_all(
-            "SELECT name, author_id, response FROM tags WHERE guild_id=:guild_id",
-            {"guild_id": guild_id},
-        )
-        if not data:
+            try:
+                while rows := await cursor.fetchmany(chunk_size):
+                    yield rows
+            finally:
+                await cursor.close()
+
+    async def import_tags(
+        self,
+        guild_id: int,
+        rows: Iterable[Tuple[str, int, str]],
+        *,
+        replace: bool = False,
+        chunk_size: int = 1000,
+    ) -> int:
+        """Write ``(name, author_id, response)`` rows in one transaction
+
+        ``rows`` is consumed a chunk at a time so it can be read straight from a file.
+        Tags which already exist are skipped unless ``replace`` is set.
+        Returns how many were written
+        """
+        await self._flush_pending()
+        query = statements.UPSERT_TAG if replace else statements.INSERT_TAG_IGNORE
+        rows = iter(rows)
+        written = 0
+        async with self.cursor.transaction():
+            while chunk := list(itertools.islice(rows, chunk_size)):
+                values = [
+                    {
+                        "guild_id": guild_id,
+                        "name": name,
+                        "author_id": author_id,
+                        "response": response,
+                    }
+                    for name, author_id, response in chunk
+                ]
+                written += await self.cursor.execute_many(query, values)
+        # The guild is loaded again the next time it's used instead of updated tag by tag
+        self.evict_guild(guild_id)
+        return written
+
+
+class TagPages(PageSource):
+    """A guild's tags, fetched from the database a page at a time as they're shown"""
+
+    name = "tags"
+    title = "Tags"
+    per_page: int = 15
+
+    def __init__(self, manager: TagManager):
+        self.manager = manager
+
+    async def get_page(
+        self, guild_id: int, index: int, shown: Optional[Page] = None
+    ) -> Optional[Page]:
+        if shown is not None and shown.cursor and index >= 0 and abs(index - shown.index) == 1:
+            # Stepping from the page the menu is on only reads the next page by name
+            first, last = shown.cursor
+            edge = {"after": last} if index > shown.index else {"before": first}
+            rows = await self.manager.get_tags_page(guild_id, limit=self.per_page, **edge)
+            if rows:
+                # Tags could have been added since the count, don't show page 5/4
+                return self._page(index, max(shown.count, index + 1), rows)
+        # Jumping to either end, wrapping around or a menu that isn't remembered
+        if not (count := await self.manager.count_tags(guild_id)):
             return None
-        ret = {}
-        for payload in data:
-            p = list(payload)
-            name = p.pop(0)
-            ret[name] = {k: v for k, v in zip(("author_id", "response"), p)}
-        return ret
-
-
-class TagSource:
-    def __init__(self, data: list):
-        self.data = data
-        self.max_pages = len(self.data)
-
-    async def format_page(self, menu: TagMenu, page: str) -> Union[discord.Embed, str]:
-        ctx = menu.ctx
-        footer = f"Page {menu.current_page + 1}/{self.max_pages}"
-        if ctx.guild and not ctx.channel.permissions_for(ctx.me).embed_links:
-            return f"**Tags**\n\n{page}\n{footer}"
-        return discord.Embed(
-            title="Tags",
-            description=page,
-            colour=0x00ffff,
-            timestamp=datetime.datetime.now(datetime.timezone.utc)
-        ).set_footer(text=footer)
-
-    def get_page(self, index: int) -> str:
-        return self.data[index]
-
-
-class TagMenu(discord.ui.View):
-    def __init__(self, ctx: Context, source: TagSource):
-        super().__init__()
-        self.ctx = ctx
-        self.source = source
-        self.current_page: int = 0
-        self.message: discord.Message = None
-
-    async def on_timeout(self) -> None:
-        await self.message.edit(view=None)
-
-    async def interaction_check(self, inter: discord.Interaction) -> bool:
-        if inter.user.id != self.ctx.author.id:
-            await inter.response.send_message("Only the author of the command can interact with this", ephemeral=True)
-            return False
-        return True
-
-    async def _get_kwargs_from_page(self, page: str) -> dict:
-        data = await self.source.format_page(self, page)
-        if isinstance(data, discord.Embed):
-            return {"embed": data, "view": self}
-        return {"content": data, "view": self}
-
-    async def start(self) -> None:
-        await self.show_page(0)
-
-    async def show_checked_page(self, index: int) -> None:
-        try:
-            if self.source.max_pages > index >= 0:
-                await self.show_page(index)
-            elif self.source.max_pages <= index:
-                await self.show_page(0)
-            elif 0 > index:
-                await self.show_page(self.source.max_pages - 1)
-        except IndexError:
-            pass
-
-    async def show_page(self, index: int) -> None:
-        page = self.source.get_page(index)
-        self.current_page = index
-        kwargs = await self._get_kwargs_from_page(page)
-        if not self.message:
-            self.message = await self.ctx.send(**kwargs)
-            return
-        await self.message.edit(**kwargs)
-
-    @discord.ui.button(emoji="\N{BLACK LEFT-POINTING DOUBLE TRIANGLE}", style=discord.ButtonStyle.grey)
-    async def go_to_first_page(self, button: discord.ui.Button, inter: discord.Interaction):
-        await self.show_page(0)
-
-    @discord.ui.button(emoji="\N{BLACK LEFT-POINTING TRIANGLE}\N{VARIATION SELECTOR-16}", style=discord.ButtonStyle.grey)
-    async def go_to_previous_page(self, button: discord.ui.Button, inter: discord.Interaction):
-        await self.show_checked_page(self.current_page - 1)
-
-    @discord.ui.button(emoji="\N{HEAVY MULTIPLICATION X}\N{VARIATION SELECTOR-16}", style=discord.ButtonStyle.red)
-    async def stop_pages(self, button: discord.ui.Button, inter: discord.Interaction):
-        self.stop()
-        await self.message.delete()
-
-    @discord.ui.button(emoji="\N{BLACK RIGHT-POINTING TRIANGLE}\N{VARIATION SELECTOR-16}", style=discord.ButtonStyle.grey)
-    async def go_to_next_page(self, button: discord.ui.Button, inter: discord.Interaction):
-        await self.show_checked_page(self.current_page + 1)
-
-    @discord.ui.button(emoji="\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE}", style=discord.ButtonStyle.grey)
-    async def go_to_last_page(self, button: discord.ui.Button, inter: discord.Interaction):
-        await self.show_checked_page(-1)
+        max_pages = -(-count // self.per_page)
+        index %= max_pages
+        if index == max_pages - 1 and index:
+            # Counting back from the end is an index walk, the offset would be a long one
+            limit = count - index * self.per_page
+            rows = await self.manager.get_tags_page(guild_id, last=True, limit=limit)
+        else:
+            offset = index * self.per_page
+            rows = await self.manager.get_tags_page(guild_id, offset=offset, limit=self.per_page)
+        if not rows:
+            return Page(index, max_pages, "There are no tags on this page.")
+        return self._page(index, max_pages, rows)
+
+    def _page(self, index: int, count: int, rows: List[Tuple[str, str]]) -> Page:
+        lines = []
+        for name, res in rows:
+            if len(res) > 30:
+                res = res[:30] + "..."
+            lines.append(f"{name}: {res}")
+        return Page(index, count, "\n".join(lines), (rows[0][0], rows[-1][0]))
 
 
 if TYPE_CHECKING:
@@ -222,27 +553,160 @@ else:
             return arg
 
 
+_EXPORT_FORMATS: Tuple[str, ...] = ("jsonl", "csv")
+_EXPORT_FIELDS: Tuple[str, ...] = ("name", "author_id", "response")
+
+
+class TagReader:
+    """Reads ``(name, author_id, response)`` rows out of an export one at a time
+
+    Rows which couldn't be saved with ``tag create`` are counted in :attr:`skipped`
+    instead of stopping the import
+    """
+
+    def __init__(self, fp: TextIO, fmt: str, *, author_id: int, reserved: Iterable[str]):
+        self.fp = fp
+        self.fmt = fmt
+        self.author_id = author_id
+        self.reserved = frozenset(reserved)
+        self.read = 0
+        self.skipped = 0
+
+    def _records(self) -> Iterator[Any]:
+        if self.fmt == "csv":
+            yield from csv.DictReader(self.fp)
+            return
+        for line in self.fp:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+    def _validate(self, record: Any) -> Optional[Tuple[str, int, str]]:
+        if not isinstance(record, dict):
+            return None
+        name, response = record.get("name"), record.get("response")
+        if not isinstance(name, str) or not isinstance(response, str):
+            return None
+        name = name.strip().lower()
+        if not name or len(name) > 100 or " " in name or name in self.reserved:
+            return None
+        elif not response or len(response) > MESSAGE_LIMIT:
+            return None
+        try:
+            compile_template(response)
+            author_id = int(record.get("author_id") or self.author_id)
+        except (TemplateError, TypeError, ValueError):
+            return None
+        return name, author_id, response
+
+    def __iter__(self) -> Iterator[Tuple[str, int, str]]:
+        for record in self._records():
+            self.read += 1
+            if (row := self._validate(record)) is None:
+                self.skipped += 1
+            else:
+                yield row
+
+
+def write_tags(fp: TextIO, fmt: str, rows: Iterable[Tuple[str, int, str]]) -> None:
+    if fmt == "csv":
+        csv.writer(fp).writerows(rows)
+        return
+    fp.writelines(
+        json.dumps(dict(zip(_EXPORT_FIELDS, row)), ensure_ascii=False) + "\n" for row in rows
+    )
+
+
+def _is_tag_admin():
+    return commands.check_any(
+        commands.is_owner(), commands.has_guild_permissions(administrator=True)
+    )
+
+
 class Tags(commands.Cog):
     def __init__(self, bot: Bot):
         self.bot = bot
         self.tag_manager = TagManager(self.bot, self.bot.loop)
         self._blacklist_names = ["create"]
 
+    async def cog_load(self) -> None:
+        await self.tag_manager.initialize()
+        self.bot.pages.register(TagPages(self.tag_manager))
+
+    async def cog_unload(self) -> None:
+        self.bot.pages.unregister(TagPages.name)
+        await self.tag_manager.teardown()
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild) -> None:
+        self.tag_manager.evict_guild(guild.id)
+
     @commands.group(name="tag", invoke_without_command=True)
     @commands.guild_only()
-    async def tag(self, ctx: Context, tag_name: str):
-        tag_name, *_ = tag_name.lower().partition(" ")
+    async def tag(self, ctx: Context, tag_name: str, *, args: str = ""):
+        tag_name = tag_name.lower()
         data = await self.tag_manager.get_tag(tag_name, ctx.guild.id)
         if not data:
-            # Assume that they misspelled a subcommand
-            return await ctx.show_help()
-        await ctx.send(data["response"])
+            matches = await self.tag_manager.search_tags(
+                tag_name, ctx.guild.id, limit=3, threshold=_SUGGESTION_THRESHOLD
+            )
+            if not matches:
+                # Assume that they misspelled a subcommand
+                return await ctx.show_help()
+            names = ", ".join(f"`{name}`" for name, _ in matches)
+            return await ctx.send(f"I could not find that tag. Did you mean: {names}?")
+        if data.template is None:
+            await ctx.send(data.response)
+        elif not (text := data.render(ctx, args)).strip():
+            # Discord won't send an empty message, which is what {args} comes out as without any
+            return await ctx.send(
+                "That tag came out empty, it probably needs some args after its name."
+            )
+        else:
+            # Whoever uses the tag picks the args, so they don't get to ping anyone with it
+            await ctx.send(text, allowed_mentions=_TEMPLATE_MENTIONS)
+        self.tag_manager.record_use(tag_name, ctx.guild.id)
+
+    @tag.command(name="stats")
+    @commands.guild_only()
+    async def tag_stats(self, ctx: Context, name: ValidTag):
+        if not await self.tag_manager.get_tag(name, ctx.guild.id):
+            return await ctx.send("I could not find that tag.")
+        board = await self.tag_manager.get_board(ctx.guild.id)
+        uses = board.counts.get(name, 0)
+        await ctx.send(f"`{name}` has been used {uses} time{'s' if uses != 1 else ''}.")
+
+    @tag.command(name="top", extras={"expensive": True})
+    @commands.guild_only()
+    async def tag_top(self, ctx: Context):
+        board = await self.tag_manager.get_board(ctx.guild.id)
+        top = board.leaderboard()
+        if not top:
+            return await ctx.send("No tags have been used in this guild yet.")
+        msg = "\n".join(f"{i}. {name}: {uses}" for i, (name, uses) in enumerate(top, 1))
+        await ctx.send(box(msg))
+
+    @tag.command(name="search", extras={"expensive": True})
+    @commands.guild_only()
+    async def tag_search(self, ctx: Context, *, query: str):
+        matches = await self.tag_manager.search_tags(query[:100], ctx.guild.id)
+        if not matches:
+            return await ctx.send("I could not find any tags matching that.")
+        msg = "\n".join(f"{i}. {name}" for i, (name, _) in enumerate(matches, 1))
+        await ctx.send(box(msg))
 
     @tag.command(name="create")
     @commands.guild_only()
     async def tag_create(self, ctx: Context, name: ValidTag, *, response: clean_content):
         if await self.tag_manager.get_tag(name, ctx.guild.id):
             return await ctx.send("That tag already exists.")
+        try:
+            compile_template(response)
+        except TemplateError as e:
+            return await ctx.send(f"That tag's response is broken: {e}")
         await self.tag_manager.save_tag(name, ctx.author.id, response, ctx.guild.id)
         await ctx.tick()
 
@@ -252,26 +716,79 @@ class Tags(commands.Cog):
         tag = await self.tag_manager.get_tag(name, ctx.guild.id)
         if not tag:
             return await ctx.send("I could not find that tag.")
-        if tag["author_id"] != ctx.author.id and not (await self.bot.is_owner(ctx.author) or ctx.guild.owner_id == ctx.author.id):
+        if tag.author_id != ctx.author.id and not (
+            await self.bot.is_owner(ctx.author) or ctx.guild.owner_id == ctx.author.id
+        ):
             return await ctx.send("You are not the author of that tag")
         await self.tag_manager.delete_tag(name, ctx.guild.id)
         await ctx.tick()
 
-    @tag.command(name="list")
+    @tag.command(name="export", extras={"expensive": True})
+    @commands.guild_only()
+    @_is_tag_admin()
+    async def tag_export(self, ctx: Context, fmt: str = "jsonl"):
+        """Export this guild's tags as JSON Lines or CSV"""
+        fmt = fmt.lower()
+        if fmt not in _EXPORT_FORMATS:
+            return await ctx.send("I can export tags as `jsonl` or `csv`")
+        count = 0
+        with tempfile.TemporaryFile() as fp:
+            text = io.TextIOWrapper(fp, encoding="utf-8", newline="")
+            if fmt == "csv":
+                csv.writer(text).writerow(_EXPORT_FIELDS)
+            async for rows in self.tag_manager.export_tags(ctx.guild.id):
+                write_tags(text, fmt, rows)
+                count += len(rows)
+            text.flush()
+            text.detach()  # Otherwise closing the wrapper closes the file
+            if not count:
+                return await ctx.send("This guild does not have any tags.")
+            if fp.tell() > ctx.guild.filesize_limit:
+                return await ctx.send("That export is too big to upload here")
+            fp.seek(0)
+            file = discord.File(fp, filename=f"tags-{ctx.guild.id}.{fmt}")
+            await ctx.send(f"Exported {count} tags.", file=file)
+
+    @tag.command(name="import")
+    @commands.guild_only()
+    @_is_tag_admin()
+    async def tag_import(self, ctx: Context, mode: str = "skip"):
+        """Import tags from an attached JSON Lines or CSV export
+
+        Tags that already exist are skipped, pass `replace` to overwrite them instead
+        """
+        if not ctx.message.attachments:
+            return await ctx.send("Attach a `.jsonl` or `.csv` file of tags to import")
+        elif mode.lower() not in ("skip", "replace"):
+            return await ctx.send("The mode has to be `skip` or `replace`")
+        attachment = ctx.message.attachments[0]
+        fmt = "csv" if attachment.filename.lower().endswith(".csv") else "jsonl"
+        reserved = self.tag.all_commands.keys()
+        with tempfile.TemporaryFile() as fp:
+            await attachment.save(fp)
+            fp.seek(0)
+            text = io.TextIOWrapper(fp, encoding="utf-8", newline="")
+            reader = TagReader(text, fmt, author_id=ctx.author.id, reserved=reserved)
+            try:
+                written = await self.tag_manager.import_tags(
+                    ctx.guild.id, reader, replace=mode.lower() == "replace"
+                )
+            except (UnicodeDecodeError, csv.Error):
+                return await ctx.send("I couldn't read that file, nothing was imported")
+        existing = reader.read - reader.skipped - written
+        msg = f"Imported {written} tags."
+        if existing > 0:
+            msg += f" {existing} already existed."
+        if reader.skipped:
+            msg += f" Skipped {reader.skipped} rows which weren't valid tags."
+        await ctx.send(msg)
+
+    @tag.command(name="list", extras={"expensive": True})
     @commands.guild_only()
     async def tag_list(self, ctx: Context):
-        tags = await self.tag_manager.get_tags(ctx.guild.id)
-        if not tags:
-            return await ctx.send("This guild does not have any tags.")
-        data = ""
-        for key, value in tags.items():
-            res = value["response"]
-            if len(res) > 30:
-                res = res[:30] + "..."
-            data += f"{key}: {res}\n"
-        source = TagSource(pagify(data))
-        await TagMenu(ctx, source).start()
+        if await self.bot.pages.start(ctx, TagPages.name, ctx.guild.id) is None:
+            await ctx.send("This guild does not have any tags.")
 
 
-def setup(bot: Bot) -> None:
-    bot.add_cog(Tags(bot))
+async def setup(bot: Bot) -> None:
+    await bot.add_cog(Tags(bot))
@@ -5,3 +5,39 @@ token: str = ""
 
 prefixes: list = []
 # This will be the list of your prefixes
+
+prefix_cache_size: int = 10_000
+# The maximum amount of guilds whose prefixes are kept in memory
+
+tag_cache_budget: int = 64 * 1024 * 1024
+# Roughly how many bytes of tags to keep in memory before the least recently used
+# guilds are dropped
+
+write_behind: bool = False
+# Whether tag, prefix and blacklist writes are batched in the background instead of
+# committed right away
+
+tag_usage_flush_interval: float = 60.0
+# How often, in seconds, tag use counts are saved
+
+metrics_port: int = None
+# The local port to serve Prometheus metrics on, if any. Each cluster uses this plus its cluster id
+
+user_rate: float = 0.5
+user_burst: int = 5
+guild_rate: float = 5.0
+guild_burst: int = 30
+# How many commands a user or guild can run per second, and how many at once
+
+shed_expensive_lag: float = 0.25
+shed_all_lag: float = 1.0
+# Seconds of event loop lag after which expensive commands, then all commands, are ignored
+
+outbound_queue: int = 50
+# How many sends can queue up in one channel before ticks and such are skipped
+
+log_json: bool = False
+# Write logs as JSON lines instead of plain text
+
+log_sampling: dict = {}
+# Share of info and debug logs to keep per logger, eg {"discord.gateway": 0.1}
@@ -0,0 +1,245 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+# Runs the bot as several processes ("clusters"), each with its own range of shards
+# Usage: python launcher.py --clusters 4 --shards 16 [--offline]
+#
+# With --offline the clusters run against a fake gateway and every line typed into
+# the launcher is sent to cluster 0 as a message from the owner, or to cluster n
+# when it starts with "n: ". Replies show up in the clusters' logs
+
+from __future__ import annotations
+
+import argparse
+import logging
+import multiprocessing
+import queue
+import sys
+import threading
+import time
+from multiprocessing.connection import Connection, wait
+from typing import Any, Dict, List, Optional
+
+log = logging.getLogger("launcher")
+
+# A crashed cluster waits this long before it's restarted, doubling each time it
+# crashes again within STABLE_AFTER seconds of starting, up to RESTART_DELAY_MAX
+RESTART_DELAY = 1.0
+RESTART_DELAY_MAX = 300.0
+STABLE_AFTER = 60.0
+
+
+def run_cluster(
+    cluster_id: int, shard_ids: List[int], shard_count: int, conn: Connection, offline: bool
+) -> None:
+    # Imported here so the launcher itself never has to import discord
+    import config
+    from bot import Bot, init_logging
+
+    # A forked cluster still has the launcher's handler, init_logging sets up its own
+    logging.getLogger().handlers.clear()
+    with init_logging(filename=f"yesbot-cluster-{cluster_id}.log"):
+        bot = Bot(
+            shard_ids=shard_ids,
+            shard_count=shard_count,
+            ipc_connection=conn,
+            cluster_id=cluster_id,
+            offline=offline,
+        )
+        bot.run(config.token, log_handler=None)
+
+
+def shard_ranges(shard_count: int, clusters: int) -> List[List[int]]:
+    """Split the shards into contiguous ranges, one per cluster"""
+    per, extra = divmod(shard_count, clusters)
+    ret, start = [], 0
+    for i in range(clusters):
+        end = start + per + (i < extra)
+        ret.append(list(range(start, end)))
+        start = end
+    return ret
+
+
+class Cluster:
+    def __init__(self, cluster_id: int, shard_ids: List[int], shard_count: int, offline: bool):
+        self.id = cluster_id
+        self.shard_ids = shard_ids
+        self.shard_count = shard_count
+        self.offline = offline
+        self.conn: Optional[Connection] = None
+        self.process: Optional[multiprocessing.Process] = None
+        self.health: Dict[str, Any] = {}
+        self.last_seen: float = 0.0
+        self.started_at: float = 0.0
+        self.restart_delay = RESTART_DELAY
+        self.restart_at: Optional[float] = None
+
+    def start(self) -> None:
+        self.conn, child = multiprocessing.Pipe()
+        self.process = multiprocessing.Process(
+            target=run_cluster,
+            args=(self.id, self.shard_ids, self.shard_count, child, self.offline),
+            name=f"cluster-{self.id}",
+        )
+        self.process.start()
+        child.close()
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        log.info("Started cluster %s with shards %s", self.id, self.shard_ids)
+
+    def schedule_restart(self) -> float:
+        """Pick when to restart this cluster after it crashed and return the delay"""
+        if time.monotonic() - self.started_at >= STABLE_AFTER:
+            self.restart_delay = RESTART_DELAY
+        delay = self.restart_delay
+        self.restart_delay = min(delay * 2, RESTART_DELAY_MAX)
+        self.restart_at = time.monotonic() + delay
+        return delay
+
+    def send(self, msg: Dict[str, Any]) -> None:
+        try:
+            self.conn.send(msg)
+        except (OSError, EOFError):
+            pass  # It's gone, the main loop will notice
+
+
+class Launcher:
+    """Starts the clusters, relays broadcasts between them and collects their health"""
+
+    def __init__(
+        self, clusters: int, shard_count: int, *, offline: bool = False, report: float = 60.0
+    ):
+        self.clusters = [
+            Cluster(i, shards, shard_count, offline)
+            for i, shards in enumerate(shard_ranges(shard_count, clusters))
+        ]
+        self.report_interval = report
+        self.closing = False
+        self.offline = offline
+        self.typed: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+
+    def health_report(self) -> Dict[int, Dict[str, Any]]:
+        now = time.monotonic()
+        return {
+            c.id: {
+                **c.health,
+                "alive": bool(c.process and c.process.is_alive()),
+                "last_seen": round(now - c.last_seen, 1) if c.last_seen else None,
+            }
+            for c in self.clusters
+        }
+
+    def handle(self, cluster: Cluster, msg: Dict[str, Any]) -> None:
+        op = msg["op"]
+        if op == "health":
+            cluster.health = msg["health"]
+            cluster.last_seen = time.monotonic()
+        elif op == "health_report":
+            report = self.health_report()
+            cluster.send({"op": "health_report", "nonce": msg["nonce"], "clusters": report})
+        elif op == "broadcast":
+            payload = msg["payload"]
+            if payload["op"] == "shutdown":
+                self.closing = True
+            for c in self.clusters:
+                c.send(payload)
+        else:
+            log.debug("Ignoring unknown op %r from cluster %s", op, cluster.id)
+
+    def _read_stdin(self) -> None:
+        for line in sys.stdin:
+            if line.strip():
+                self.typed.put(line.rstrip("\n"))
+
+    def _send_typed(self) -> None:
+        while True:
+            try:
+                line = self.typed.get_nowait()
+            except queue.Empty:
+                return
+            target, sep, content = line.partition(": ")
+            if not (sep and target.isdigit() and int(target) < len(self.clusters)):
+                target, content = "0", line
+            self.clusters[int(target)].send({"op": "inject", "content": content})
+
+    def run(self) -> None:
+        for cluster in self.clusters:
+            cluster.start()
+        if self.offline:
+            threading.Thread(target=self._read_stdin, name="launcher-stdin", daemon=True).start()
+        last_report = time.monotonic()
+        try:
+            while True:
+                # Checked right after scheduling, a cluster that just crashed still counts
+                self._restart_dead()
+                running = (c.process.is_alive() or c.restart_at is not None for c in self.clusters)
+                if not any(running):
+                    break
+                by_conn = {c.conn: c for c in self.clusters if not c.conn.closed}
+                for conn in wait(list(by_conn), timeout=1.0):
+                    cluster = by_conn[conn]
+                    try:
+                        msg = conn.recv()
+                    except (OSError, EOFError):
+                        conn.close()
+                        continue
+                    self.handle(cluster, msg)
+                self._send_typed()
+                if time.monotonic() - last_report >= self.report_interval:
+                    last_report = time.monotonic()
+                    for cluster_id, health in self.health_report().items():
+                        log.info("Cluster %s: %s", cluster_id, health)
+        except KeyboardInterrupt:
+            self.closing = True
+            for c in self.clusters:
+                c.send({"op": "shutdown"})
+        for c in self.clusters:
+            c.process.join(timeout=30)
+            if c.process.is_alive():
+                c.process.terminate()
+
+    def _restart_dead(self) -> None:
+        if self.closing:
+            for cluster in self.clusters:
+                cluster.restart_at = None  # Let the main loop end instead of waiting on them
+            return
+        now = time.monotonic()
+        for cluster in self.clusters:
+            if cluster.process.is_alive() or cluster.process.exitcode == 0:
+                continue
+            if cluster.restart_at is None:
+                delay = cluster.schedule_restart()
+                log.warning(
+                    "Cluster %s exited with %s, restarting it in %.1fs",
+                    cluster.id,
+                    cluster.process.exitcode,
+                    delay,
+                )
+                cluster.conn.close()
+            elif now >= cluster.restart_at:
+                cluster.start()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run the bot across several processes")
+    parser.add_argument("--clusters", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--shards", type=int, required=True, help="The total amount of shards")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Run against a fake gateway and send typed lines to the clusters as messages",
+    )
+    args = parser.parse_args()
+    if not 0 < args.clusters <= args.shards:
+        parser.error("There has to be at least one shard per cluster")
+    logging.basicConfig(
+        level=logging.INFO,
+        format="[{asctime}] [{levelname}] {name}: {message}",
+        style="{",
+        stream=sys.stdout,
+    )
+    Launcher(args.clusters, args.shards, offline=args.offline).run()
+
+
+if __name__ == "__main__":
+    main()
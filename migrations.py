@@ -0,0 +1,165 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+# Schema migrations for the bot's database
+# Every migration runs once, in order, in its own transaction. Add new ones to the end
+
+from __future__ import annotations
+
+import logging
+import re
+import sqlite3
+from typing import List, Tuple
+
+import statements
+
+log = logging.getLogger("migrations")
+
+CREATE_SCHEMA_VERSION_TABLE: str = """CREATE TABLE IF NOT EXISTS
+    schema_version (
+        version INT NOT NULL
+    )
+""".strip()
+
+
+def _change_log_triggers(
+    table: str, scope: str, key_id: str, key_name: str = None
+) -> Tuple[str, ...]:
+    """Triggers which log every write to a table's rows into change_log"""
+    ret = []
+    for event, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+        name = f"{row}.{key_name}" if key_name else "''"
+        ret.append(
+            f"""CREATE TRIGGER {table}_{event.lower()}_log AFTER {event} ON {table}
+            BEGIN
+                INSERT INTO change_log (scope, key_id, key_name)
+                VALUES ('{scope}', {row}.{key_id}, {name});
+            END"""
+        )
+    return tuple(ret)
+
+
+MIGRATIONS: List[Tuple[int, str, Tuple[str, ...]]] = [
+    (
+        1,
+        "Create the original tables",
+        (
+            statements.CREATE_PREFIX_TABLE,
+            statements.CREATE_BLACKLIST_TABLE,
+            statements.CREATE_TAGS_TABLE,
+        ),
+    ),
+    (
+        2,
+        "Key tags on (guild_id, name) and index their authors",
+        (
+            """CREATE TABLE tags_new (
+                guild_id INT NOT NULL,
+                name TEXT NOT NULL,
+                author_id INT NOT NULL,
+                response TEXT NOT NULL,
+                PRIMARY KEY (guild_id, name)
+            )""",
+            """INSERT INTO tags_new (guild_id, name, author_id, response)
+                SELECT guild_id, name, author_id, response FROM tags""",
+            "DROP TABLE tags",
+            "ALTER TABLE tags_new RENAME TO tags",
+            # The primary key's index already covers lookups by guild_id alone
+            "CREATE INDEX tags_author_id ON tags (author_id)",
+        ),
+    ),
+    (3, "Count tag uses", (statements.CREATE_TAG_USAGE_TABLE,)),
+    (
+        4,
+        "Log changes to cached tables",
+        (
+            statements.CREATE_CHANGE_LOG_TABLE,
+            *_change_log_triggers("guild_prefixes", "prefixes", "guild_id"),
+            *_change_log_triggers("blacklist", "blacklist", "user_id"),
+            *_change_log_triggers("tags", "tags", "guild_id", "name"),
+        ),
+    ),
+    (
+        5,
+        "Let blacklist entries expire",
+        (
+            "ALTER TABLE blacklist ADD COLUMN expires_at REAL",
+            """CREATE INDEX blacklist_expires_at ON blacklist (expires_at)
+                WHERE expires_at IS NOT NULL""",
+        ),
+    ),
+    (
+        6,
+        "Record which process logged each change",
+        ("ALTER TABLE change_log ADD COLUMN origin INT",),
+    ),
+]
+
+# Queries that run on hot paths and must be served from an index
+HOT_QUERIES: Tuple[str, ...] = (
+    statements.SELECT_PREFIXES,
+    statements.SELECT_BLACKLIST,
+    statements.SELECT_GUILD_TAGS,
+    statements.COUNT_GUILD_TAGS,
+    statements.SELECT_TAGS_AFTER,
+    statements.SELECT_TAGS_BEFORE,
+    statements.SELECT_LAST_TAGS,
+    statements.SELECT_TAGS_OFFSET,
+    statements.EXPORT_GUILD_TAGS,
+    statements.DELETE_TAG,
+    statements.SELECT_GUILD_TAG_USAGE,
+    statements.DELETE_TAG_USAGE,
+    statements.SELECT_CHANGES,
+    statements.SELECT_BLACKLIST_EXPIRIES,
+)
+
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    conn.execute(CREATE_SCHEMA_VERSION_TABLE)
+    row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    return row[0] or 0
+
+
+def run_migrations(conn: sqlite3.Connection) -> int:
+    """Bring the database up to the latest schema and return its version
+
+    The connection has to be in autocommit mode (``isolation_level=None``)
+    """
+    current = schema_version(conn)
+    for version, description, queries in MIGRATIONS:
+        if version <= current:
+            continue
+        # Takes the write lock straight away, other processes sharing the file wait
+        # here and then see that the migration has already been done
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()[0] or 0
+            if version <= current:
+                conn.execute("ROLLBACK")
+                continue
+            log.info("Migrating the database to version %s: %s", version, description)
+            for query in queries:
+                conn.execute(query)
+            conn.execute("INSERT INTO schema_version (version) VALUES (?)", (version,))
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        current = version
+    return current
+
+
+def explain(conn: sqlite3.Connection, query: str) -> List[str]:
+    """The steps of a query's plan, with every parameter bound to NULL"""
+    params = dict.fromkeys(re.findall(r":(\w+)", query))
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def find_table_scans(conn: sqlite3.Connection) -> List[Tuple[str, List[str]]]:
+    """Return the hot queries whose plans scan a table or sort without an index"""
+    ret = []
+    for query in HOT_QUERIES:
+        plan = explain(conn, query)
+        if any(step.startswith("SCAN") or "TEMP B-TREE" in step for step in plan):
+            ret.append((query, plan))
+    return ret
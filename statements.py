@@ -8,6 +8,7 @@ CREATE_PREFIX_TABLE: str = """CREATE TABLE IF NOT EXISTS
 """.strip()
 SELECT_PREFIXES: str = """SELECT (prefixes) FROM guild_prefixes WHERE guild_id=:guild_id
 """.strip()
+SELECT_ALL_PREFIXES: str = """SELECT guild_id, prefixes FROM guild_prefixes""".strip()
 UPSERT_PREFIXES: str = """INSERT OR REPLACE INTO
 guild_prefixes
     (guild_id, prefixes)
@@ -24,10 +25,119 @@ CREATE_BLACKLIST_TABLE: str = """CREATE TABLE IF NOT EXISTS
 """.strip()
 
 SELECT_BLACKLIST: str = """SELECT (reason) FROM blacklist WHERE user_id=:user_id"""
+SELECT_BLACKLISTED_USERS: str = """SELECT user_id FROM blacklist"""
+SELECT_ALL_BLACKLIST: str = """SELECT user_id, reason FROM blacklist"""
+# :user_ids is a JSON array
+SELECT_BLACKLIST_IN: str = """SELECT user_id, reason, expires_at FROM blacklist
+WHERE user_id IN (SELECT value FROM json_each(:user_ids))"""
+# expires_at is a unix timestamp, permanent entries have it NULL and aren't in its index
+SELECT_BLACKLIST_EXPIRIES: str = """SELECT user_id, expires_at FROM blacklist
+WHERE expires_at IS NOT NULL ORDER BY expires_at"""
+DELETE_BLACKLIST: str = """DELETE FROM blacklist WHERE user_id=:user_id"""
+# Only deletes the entry if it hasn't been extended or made permanent since
+DELETE_EXPIRED_BLACKLIST: str = """DELETE FROM blacklist
+WHERE user_id=:user_id AND expires_at <= :now"""
+CLEAR_BLACKLIST: str = """DELETE FROM blacklist"""
 
 UPSERT_REASON: str = """INSERT OR REPLACE INTO
 blacklist
-    (user_id, reason)
+    (user_id, reason, expires_at)
 VALUES
-    (:user_id, :reason)
+    (:user_id, :reason, :expires_at)
 """.strip()
+
+# Tag stuffs
+CREATE_TAGS_TABLE: str = """CREATE TABLE IF NOT EXISTS
+    tags (
+        name TEXT PRIMARY KEY,
+        author_id INT NOT NULL,
+        guild_id INT NOT NULL,
+        response TEXT NOT NULL
+    )
+""".strip()
+SELECT_TAG: str = "SELECT author_id, response FROM tags WHERE name=:name AND guild_id=:guild_id"
+SELECT_GUILD_TAGS: str = "SELECT name, author_id, response FROM tags WHERE guild_id=:guild_id"
+# :names is a JSON array
+SELECT_GUILD_TAGS_IN: str = """SELECT name, author_id, response FROM tags
+WHERE guild_id=:guild_id AND name IN (SELECT value FROM json_each(:names))"""
+COUNT_GUILD_TAGS: str = "SELECT COUNT(*) FROM tags WHERE guild_id=:guild_id"
+# Only enough of the response is selected for the list's preview
+SELECT_TAGS_AFTER: str = """SELECT name, substr(response, 1, 33) AS preview FROM tags
+WHERE guild_id=:guild_id AND name > :name ORDER BY name LIMIT :limit"""
+SELECT_TAGS_BEFORE: str = """SELECT name, substr(response, 1, 33) AS preview FROM tags
+WHERE guild_id=:guild_id AND name < :name ORDER BY name DESC LIMIT :limit"""
+SELECT_LAST_TAGS: str = """SELECT name, substr(response, 1, 33) AS preview FROM tags
+WHERE guild_id=:guild_id ORDER BY name DESC LIMIT :limit"""
+SELECT_TAGS_OFFSET: str = """SELECT name, substr(response, 1, 33) AS preview FROM tags
+WHERE guild_id=:guild_id ORDER BY name LIMIT :limit OFFSET :offset"""
+INSERT_TAG: str = """INSERT INTO
+tags
+    (name, author_id, response, guild_id)
+VALUES
+    (:name, :author_id, :response, :guild_id)
+"""
+# Used for batched writes, where a pending delete may have been replaced by this
+UPSERT_TAG: str = """INSERT INTO
+tags
+    (name, author_id, response, guild_id)
+VALUES
+    (:name, :author_id, :response, :guild_id)
+ON CONFLICT (guild_id, name) DO UPDATE SET
+    author_id=excluded.author_id, response=excluded.response
+"""
+# Imports leave tags that already exist alone unless told to replace them
+INSERT_TAG_IGNORE: str = """INSERT INTO
+tags
+    (name, author_id, response, guild_id)
+VALUES
+    (:name, :author_id, :response, :guild_id)
+ON CONFLICT (guild_id, name) DO NOTHING
+"""
+DELETE_TAG: str = "DELETE FROM tags WHERE name=:name AND guild_id=:guild_id"
+EXPORT_GUILD_TAGS: str = """SELECT name, author_id, response FROM tags
+WHERE guild_id=:guild_id ORDER BY name"""
+
+# Tag usage stuffs
+CREATE_TAG_USAGE_TABLE: str = """CREATE TABLE IF NOT EXISTS
+    tag_usage (
+        guild_id INT NOT NULL,
+        name TEXT NOT NULL,
+        uses INT NOT NULL,
+        PRIMARY KEY (guild_id, name)
+    )
+""".strip()
+SELECT_GUILD_TAG_USAGE: str = "SELECT name, uses FROM tag_usage WHERE guild_id=:guild_id"
+UPSERT_TAG_USAGE: str = """INSERT INTO
+tag_usage
+    (guild_id, name, uses)
+VALUES
+    (:guild_id, :name, :uses)
+ON CONFLICT (guild_id, name) DO UPDATE SET
+    uses=uses + excluded.uses
+"""
+DELETE_TAG_USAGE: str = "DELETE FROM tag_usage WHERE name=:name AND guild_id=:guild_id"
+
+# Change log stuffs, for keeping caches in different processes in step
+CREATE_CHANGE_LOG_TABLE: str = """CREATE TABLE IF NOT EXISTS
+    change_log (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        scope TEXT NOT NULL,
+        key_id INT NOT NULL,
+        key_name TEXT NOT NULL DEFAULT ''
+    )
+""".strip()
+SELECT_CHANGE_LOG_VERSION: str = "SELECT MAX(version) FROM change_log"
+SELECT_CHANGE_LOG_OLDEST: str = "SELECT MIN(version) FROM change_log"
+# Changes up to :top which weren't written by this process
+SELECT_CHANGES: str = """SELECT version, scope, key_id, key_name FROM change_log
+WHERE version > :version AND version <= :top AND origin IS NOT :origin ORDER BY version"""
+# Created on each of a process's write connections, the triggers on the cached
+# tables can't tell which process is writing. Temp triggers only fire for writes
+# made through the connection that created them
+CREATE_CHANGE_LOG_ORIGIN_TRIGGER: str = """CREATE TEMP TRIGGER IF NOT EXISTS change_log_origin
+AFTER INSERT ON change_log
+BEGIN
+    UPDATE change_log SET origin = {origin} WHERE version = NEW.version;
+END"""
+TRIM_CHANGE_LOG: str = """DELETE FROM change_log
+WHERE version <= (SELECT MAX(version) FROM change_log) - :keep"""
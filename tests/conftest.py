@@ -0,0 +1,11 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+import importlib.util
+import sys
+
+if importlib.util.find_spec("config") is None:
+    # Use the example config, nothing here needs a token
+    import config_example
+
+    sys.modules["config"] = config_example
@@ -0,0 +1,64 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import statements
+from bot import BlacklistManager
+from utils.storage import Storage
+
+
+def run_with_blacklist(tmp_path, func):
+    async def main():
+        storage = Storage(tmp_path)
+        await storage.connect()
+        manager = BlacklistManager(SimpleNamespace(storage=storage))
+        await manager.initialize()
+        try:
+            return await func(manager)
+        finally:
+            await manager.teardown()
+            await storage.close()
+
+    return asyncio.run(main())
+
+
+async def stored(manager):
+    values = {"user_ids": "[1, 2, 3, 4, 5]"}
+    rows = await manager.reader.fetch_all(statements.SELECT_BLACKLIST_IN, values)
+    return {row["user_id"]: (row["reason"], row["expires_at"]) for row in rows}
+
+
+def test_sync_only_writes_the_difference(tmp_path):
+    later = time.time() + 3600
+
+    async def check(manager):
+        await manager.add_to_blacklist([1], "gone soon", expires_at=later)
+        await manager.add_to_blacklist([2, 3], "staying", expires_at=later)
+        assert await manager.sync_blacklist([2, 3, 4, 5], "synced") == (2, 1)
+        assert sorted(manager._users) == [2, 3, 4, 5]
+        assert sorted(manager.expiry.deadlines) == [2, 3]
+        assert await stored(manager) == {
+            2: ("staying", later),
+            3: ("staying", later),
+            4: ("synced", None),
+            5: ("synced", None),
+        }
+        reasons = await manager.get_blacklist()
+        assert reasons == {2: "staying", 3: "staying", 4: "synced", 5: "synced"}
+
+    run_with_blacklist(tmp_path, check)
+
+
+def test_sync_to_the_same_users_writes_nothing(tmp_path):
+    async def check(manager):
+        await manager.add_to_blacklist([1, 2], "here")
+        version = manager.version
+        assert await manager.sync_blacklist([2, 1, 2], "synced") == (0, 0)
+        assert manager.version == version
+        assert await manager.sync_blacklist([], "synced") == (0, 2)
+        assert not manager._users and await stored(manager) == {}
+
+    run_with_blacklist(tmp_path, check)
@@ -0,0 +1,64 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+import pytest
+
+from utils.chat_formatting import box, pagify
+
+
+def _blocks(page: str):
+    """The bodies of a page's code blocks, without their language line"""
+    segments = page.split("```")
+    assert len(segments) % 2, f"unbalanced fences in {page!r}"
+    for body in segments[1::2]:
+        first, newline, rest = body.partition("\n")
+        yield rest if newline and (first.isalnum() or not first) else body
+
+
+def test_short_text_is_one_page():
+    assert list(pagify("hello\nthere", 300)) == ["hello\nthere"]
+
+
+def test_pages_fit_and_split_at_newlines():
+    text = "\n".join(f"line {i}" for i in range(100))
+    pages = list(pagify(text, 50))
+    assert all(len(page) <= 50 for page in pages)
+    assert "\n".join(pages) == text
+
+
+def test_cut_after_opening_fence_moves_it_to_the_next_page():
+    pages = list(pagify("intro line here\n" + box("x = 1\ny = 2\nz = 3\nw = 4", "py"), 25))
+    assert pages == ["intro line here", "```py\nx = 1\ny = 2```", "```py\nz = 3\nw = 4```"]
+
+
+def test_cut_inside_opening_fence_line_moves_it_to_the_next_page():
+    pages = list(pagify("intro\n" + box("x = 1", "python"), 20))
+    assert pages == ["intro", "```python\nx = 1```"]
+
+
+def test_continued_blocks_keep_their_language():
+    pages = list(pagify(box("\n".join(f"key{i}: value" for i in range(30)), "yml"), 60))
+    assert len(pages) > 2
+    assert all(page.startswith("```yml\n") and page.endswith("```") for page in pages)
+
+
+def test_closing_fence_alone_does_not_make_a_page():
+    assert list(pagify("```py\nvvvvvvv```\nw", 16)) == ["```py\nvvvvvvv```", "w"]
+
+
+@pytest.mark.parametrize("page_length", [20, 25, 33, 47, 64])
+def test_no_empty_or_unbalanced_blocks(page_length):
+    text = "\n".join(
+        [
+            "some words before",
+            box("a = 1\nb = 2\nc = 3", "py"),
+            "and some after",
+            box("key: value\nother: thing", "yml"),
+            box("plain\nblock"),
+            "the end",
+        ]
+    )
+    pages = list(pagify(text, page_length))
+    for page in pages:
+        assert len(page) <= page_length
+        assert all(body.strip() for body in _blocks(page)), page
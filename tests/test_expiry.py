@@ -0,0 +1,89 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+import asyncio
+import time
+
+from utils.expiry import ExpiryScheduler
+
+
+async def nothing(keys):
+    pass
+
+
+def test_due_keys_come_out_in_deadline_order():
+    expiry = ExpiryScheduler(nothing)
+    now = time.time()
+    expiry.schedule("c", now - 1)
+    expiry.schedule("a", now - 3)
+    expiry.schedule("later", now + 60)
+    expiry.schedule("b", now - 2)
+    assert expiry._pop_due(now) == ["a", "b", "c"]
+    assert list(expiry.deadlines) == ["later"]
+
+
+def test_rescheduled_and_cancelled_keys_skip_their_old_deadlines():
+    expiry = ExpiryScheduler(nothing)
+    now = time.time()
+    expiry.schedule("moved", now - 2)
+    expiry.schedule("gone", now - 1)
+    expiry.schedule("moved", now + 60)
+    expiry.cancel("gone")
+    assert expiry._pop_due(now) == []
+    assert expiry._pop_due(now + 61) == ["moved"]
+
+
+def test_heap_is_compacted():
+    expiry = ExpiryScheduler(nothing)
+    for i in range(100):
+        expiry.schedule("key", time.time() + 60 + i)
+    assert len(expiry._heap) <= 2 * len(expiry.deadlines) + 64
+
+
+def test_handler_is_called_as_deadlines_pass():
+    async def main():
+        expired = []
+
+        async def handler(keys):
+            expired.append((keys, time.time()))
+
+        expiry = ExpiryScheduler(handler)
+        expiry.start()
+        start = time.time()
+        expiry.schedule("second", start + 0.1)
+        expiry.schedule("first", start + 0.05)
+        await asyncio.sleep(0.2)
+        expiry.close()
+        return start, expired
+
+    start, expired = asyncio.run(main())
+    assert [keys for keys, _ in expired] == [["first"], ["second"]]
+    assert expired[0][1] >= start + 0.05 and expired[1][1] >= start + 0.1
+
+
+def test_failed_expiries_are_retried():
+    async def main():
+        calls = []
+
+        async def handler(keys):
+            calls.append(sorted(keys))
+            if len(calls) == 1:
+                # Rescheduled while the failing call is running, it keeps its new deadline
+                expiry.schedule("moved", time.time() + 0.3)
+                raise RuntimeError("database is locked")
+
+        expiry = ExpiryScheduler(handler, retry_after=0.05)
+        expiry.start()
+        now = time.time()
+        expiry.schedule("a", now)
+        expiry.schedule("moved", now)
+        await asyncio.sleep(0.15)
+        retried = list(calls)
+        await asyncio.sleep(0.3)
+        expiry.close()
+        return retried, calls, len(expiry)
+
+    retried, calls, pending = asyncio.run(main())
+    assert retried == [["a", "moved"], ["a"]]
+    assert calls == [["a", "moved"], ["a"], ["moved"]]
+    assert pending == 0
@@ -0,0 +1,56 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+import sqlite3
+import threading
+
+import pytest
+
+import migrations
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    yield conn
+    conn.close()
+
+
+def test_migrations_reach_the_latest_version(conn):
+    assert migrations.run_migrations(conn) == migrations.MIGRATIONS[-1][0]
+    # Running them again is a no-op
+    assert migrations.run_migrations(conn) == migrations.MIGRATIONS[-1][0]
+
+
+def test_hot_queries_use_indexes(conn):
+    migrations.run_migrations(conn)
+    assert migrations.find_table_scans(conn) == []
+
+
+def test_concurrent_migrations_run_once(tmp_path):
+    # Clusters share the database file and all migrate it when they start
+    path = tmp_path / "yesbot.db"
+    barrier = threading.Barrier(4)
+    errors = []
+
+    def migrate():
+        conn = sqlite3.connect(path, isolation_level=None)
+        try:
+            barrier.wait()
+            migrations.run_migrations(conn)
+        except sqlite3.Error as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=migrate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT version FROM schema_version ORDER BY version")
+    versions = [row[0] for row in rows]
+    conn.close()
+    assert versions == [version for version, _, _ in migrations.MIGRATIONS]
@@ -0,0 +1,116 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+import asyncio
+import itertools
+
+from utils.chat_formatting import MESSAGE_LIMIT
+from utils.outbound import OutboundScheduler
+
+_ids = itertools.count(1)
+
+
+class FakeMessage:
+    def __init__(self, channel, content=None):
+        self.id = next(_ids)
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, **kwargs):
+        self.channel.requests.append(("edit", self.id, kwargs))
+        return self
+
+    async def add_reaction(self, emoji):
+        self.channel.requests.append(("react", self.id, emoji))
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id = next(_ids)
+        self.requests = []
+
+    async def send(self, content=None, **kwargs):
+        self.requests.append(("send", content, kwargs))
+        return FakeMessage(self, content)
+
+
+def test_sends_queued_together_are_merged():
+    async def main():
+        outbound = OutboundScheduler()
+        channel = FakeChannel()
+        messages = await asyncio.gather(*(outbound.send(channel, f"line {i}") for i in range(3)))
+        return outbound, channel, messages
+
+    outbound, channel, messages = asyncio.run(main())
+    assert channel.requests == [("send", "line 0\nline 1\nline 2", {})]
+    # Everyone who sent a line gets the message it ended up in
+    assert len({msg.id for msg in messages}) == 1
+    assert outbound.requests == 1 and outbound.merged == 2
+
+
+def test_merging_stops_at_the_message_limit():
+    async def main():
+        channel = FakeChannel()
+        outbound = OutboundScheduler()
+        half = "x" * (MESSAGE_LIMIT // 2)
+        await asyncio.gather(*(outbound.send(channel, content) for content in (half, half, "end")))
+        return channel
+
+    sent = [content for _, content, _ in asyncio.run(main()).requests]
+    assert len(sent) == 2
+    assert all(len(content) <= MESSAGE_LIMIT for content in sent)
+    assert sent[1].endswith("\nend")
+
+
+def test_sends_with_extras_are_not_merged():
+    async def main():
+        channel = FakeChannel()
+        outbound = OutboundScheduler()
+        await asyncio.gather(
+            outbound.send(channel, "a"),
+            outbound.send(channel, "b", embed="embed"),
+            outbound.send(channel, "c"),
+        )
+        return channel
+
+    assert asyncio.run(main()).requests == [
+        ("send", "a", {}),
+        ("send", "b", {"embed": "embed"}),
+        ("send", "c", {}),
+    ]
+
+
+def test_channels_are_not_merged_together():
+    async def main():
+        first, second = FakeChannel(), FakeChannel()
+        outbound = OutboundScheduler()
+        await asyncio.gather(
+            outbound.send(first, "a"), outbound.send(second, "b"), outbound.send(first, "c")
+        )
+        return first, second
+
+    first, second = asyncio.run(main())
+    assert first.requests == [("send", "a\nc", {})]
+    assert second.requests == [("send", "b", {})]
+
+
+def test_edits_and_reactions_are_coalesced_behind_replies():
+    async def main():
+        channel = FakeChannel()
+        message = FakeMessage(channel)
+        outbound = OutboundScheduler()
+        await asyncio.gather(
+            outbound.react(message, "a"),
+            outbound.edit(message, content="old"),
+            outbound.react(message, "a"),
+            outbound.edit(message, content="new", embed=None),
+            outbound.send(channel, "reply"),
+        )
+        return channel, message.id
+
+    channel, message_id = asyncio.run(main())
+    assert channel.requests == [
+        ("send", "reply", {}),
+        ("edit", message_id, {"content": "new", "embed": None}),
+        ("react", message_id, "a"),
+    ]
@@ -0,0 +1,155 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+import asyncio
+from types import SimpleNamespace
+
+import discord
+import pytest
+
+from utils.paginator import Page, PageSource, Paginator
+
+AUTHOR = 5
+KEY = 1234
+
+
+class NumberPages(PageSource):
+    name = "numbers"
+    title = "Numbers"
+    count = 3
+
+    def __init__(self):
+        self.asked = []
+
+    async def get_page(self, key, index, shown=None):
+        self.asked.append((key, index, shown and shown.index))
+        index %= self.count
+        return Page(index, self.count, f"page {index}", cursor=index)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.calls = []
+
+    async def edit_message(self, **kwargs):
+        self.calls.append(("edit", kwargs))
+
+    async def send_message(self, content, **kwargs):
+        self.calls.append(("send", content))
+
+    async def defer(self):
+        self.calls.append(("defer",))
+
+
+class FakeMessage:
+    id = 99
+
+    def __init__(self):
+        self.deleted = False
+
+    async def delete(self):
+        self.deleted = True
+
+
+def interaction(custom_id, message, user_id=AUTHOR):
+    return SimpleNamespace(
+        type=discord.InteractionType.component,
+        data={"custom_id": custom_id},
+        user=SimpleNamespace(id=user_id),
+        message=message,
+        response=FakeResponse(),
+        guild=None,
+    )
+
+
+def custom_ids(kwargs):
+    return {item.custom_id.rsplit(":", 1)[1]: item.custom_id for item in kwargs["view"].children}
+
+
+def run_menu(func):
+    async def main():
+        paginator = Paginator()
+        source = NumberPages()
+        paginator.register(source)
+        message = FakeMessage()
+        sent = []
+
+        async def send(**kwargs):
+            sent.append(kwargs)
+            return message
+
+        ctx = SimpleNamespace(guild=None, author=SimpleNamespace(id=AUTHOR), send=send)
+        await paginator.start(ctx, source.name, KEY)
+        return await func(paginator, source, message, sent[0])
+
+    return asyncio.run(main())
+
+
+def test_buttons_hold_the_source_author_key_and_page():
+    async def check(paginator, source, message, kwargs):
+        return custom_ids(kwargs)
+
+    ids = run_menu(check)
+    assert ids == {
+        action: f"pages:numbers:{AUTHOR}:{KEY}:0:{action}"
+        for action in ("first", "prev", "stop", "next", "last")
+    }
+
+
+@pytest.mark.parametrize(
+    "action, wanted, lands_on", [("next", 1, 1), ("prev", -1, 2), ("first", 0, 0), ("last", -1, 2)]
+)
+def test_clicks_ask_for_the_page_the_button_is_for(action, wanted, lands_on):
+    async def check(paginator, source, message, kwargs):
+        inter = interaction(custom_ids(kwargs)[action], message)
+        await paginator.on_interaction(inter)
+        [(_, edited)] = inter.response.calls
+        return source.asked[-1], custom_ids(edited)
+
+    asked, ids = run_menu(check)
+    # The source is also handed the page the menu was on
+    assert asked == (KEY, wanted, 0)
+    assert ids["next"] == f"pages:numbers:{AUTHOR}:{KEY}:{lands_on}:next"
+
+
+@pytest.mark.parametrize(
+    "custom_id",
+    [
+        "other:numbers:5:1234:0:next",
+        "pages:numbers:5:1234:0",
+        "pages:numbers:5:1234:zero:next",
+        "pages:numbers:5:1234:0:next:extra",
+        "pages:numbers:5:1234:0:sideways",
+        "",
+    ],
+)
+def test_other_and_broken_custom_ids_are_ignored(custom_id):
+    async def check(paginator, source, message, kwargs):
+        inter = interaction(custom_id, message)
+        await paginator.on_interaction(inter)
+        return inter.response.calls, len(source.asked)
+
+    assert run_menu(check) == ([], 1)
+
+
+def test_only_the_author_can_click():
+    async def check(paginator, source, message, kwargs):
+        inter = interaction(custom_ids(kwargs)["next"], message, user_id=AUTHOR + 1)
+        await paginator.on_interaction(inter)
+        return inter.response.calls
+
+    assert run_menu(check) == [("send", NumberPages.denied)]
+
+
+def test_unknown_sources_and_stop():
+    async def check(paginator, source, message, kwargs):
+        gone = interaction(f"pages:gone:{AUTHOR}:{KEY}:0:next", message)
+        await paginator.on_interaction(gone)
+        stop = interaction(custom_ids(kwargs)["stop"], message)
+        await paginator.on_interaction(stop)
+        return gone.response.calls, stop.response.calls, message.deleted, paginator._shown
+
+    gone, stop, deleted, shown = run_menu(check)
+    assert gone == [("send", "This menu isn't available right now")]
+    assert stop == [("defer",)] and deleted
+    assert not shown
@@ -0,0 +1,52 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from utils.ratelimit import TokenBuckets
+
+
+def test_bucket_empties_and_refills_at_the_rate():
+    buckets = TokenBuckets(rate=2.0, capacity=3.0)
+    now = 1000.0  # Exact in binary, so the refills add up exactly
+    assert [buckets.consume("a", now=now) for _ in range(4)] == [True, True, True, False]
+    # Half a second at 2 tokens a second is one token
+    assert buckets.consume("a", now=now + 0.5)
+    assert not buckets.consume("a", now=now + 0.5)
+    assert not buckets.consume("a", now=now + 0.75)
+    assert buckets.consume("a", now=now + 1.0)
+
+
+def test_refill_stops_at_capacity():
+    buckets = TokenBuckets(rate=1.0, capacity=2.0)
+    now = 1000.0
+    assert buckets.consume("a", now=now)
+    now += 100
+    assert [buckets.consume("a", now=now) for _ in range(3)] == [True, True, False]
+
+
+def test_failed_consume_keeps_what_refilled():
+    buckets = TokenBuckets(rate=1.0, capacity=5.0)
+    now = 1000.0
+    assert buckets.consume("a", cost=5.0, now=now)
+    assert not buckets.consume("a", cost=2.0, now=now + 1.5)
+    # The 1.5 tokens from before the failed attempt are still there
+    assert buckets.consume("a", cost=2.0, now=now + 2.0)
+
+
+def test_buckets_are_separate():
+    buckets = TokenBuckets(rate=1.0, capacity=1.0)
+    now = 1000.0
+    assert buckets.consume("a", now=now)
+    assert not buckets.consume("a", now=now)
+    assert buckets.consume("b", now=now)
+
+
+def test_idle_buckets_are_swept_and_their_slots_reused():
+    buckets = TokenBuckets(rate=1.0, capacity=2.0)
+    now = 1000.0
+    buckets.consume("a", now=now)
+    buckets.consume("b", now=now + 1)
+    buckets.sweep(now + 2.5)
+    assert len(buckets) == 1
+    # A swept bucket comes back full
+    assert [buckets.consume("a", now=now + 2.5) for _ in range(3)] == [True, True, False]
+    assert len(buckets._tokens) == 2
@@ -0,0 +1,70 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from types import SimpleNamespace
+
+import pytest
+
+from utils.templates import TemplateError, compile_template
+
+USER = SimpleNamespace(id=1, name="jojo", display_name="Jojo", mention="<@1>", _state="secret")
+GUILD = SimpleNamespace(id=2, name="Yes", member_count=42)
+CHANNEL = SimpleNamespace(id=3, name="general", mention="<#3>")
+
+
+def render(source, args=""):
+    return compile_template(source).render(user=USER, guild=GUILD, channel=CHANNEL, args=args)
+
+
+def test_plain_responses_are_not_compiled():
+    assert compile_template("just some text") is None
+    # Braces around something that isn't a variable don't make it a template either
+    assert compile_template("a {thing} in braces") is None
+
+
+def test_variables_and_their_defaults():
+    assert render("hi {user}") == "hi Jojo"
+    assert render("{user.mention} in {guild} at {channel}") == "<@1> in Yes at <#3>"
+    assert render("{guild.member_count} members") == "42 members"
+
+
+def test_args():
+    assert render("[{args}]", "one two") == "[one two]"
+    assert render("{args.2}-{args.1}-{args.3}", "one two") == "two-one-"
+
+
+def test_unknown_variables_are_left_as_written():
+    assert render("{user} {nope} {args.0}") == "Jojo {nope} {args.0}"
+
+
+def test_attributes_are_allow_listed():
+    assert render("{user._state} {user.name}") == "{user._state} jojo"
+    assert compile_template("{guild.owner}") is None
+
+
+def test_double_braces_are_literal():
+    assert render("{{user}} is {user}") == "{user} is Jojo"
+    assert compile_template("{{}}").render() == "{}"
+
+
+def test_if_else_end():
+    source = "{if args}you said {args}{else}say something{end}!"
+    assert render(source, "hi") == "you said hi!"
+    assert render(source) == "say something!"
+    assert render("{if args.2}two{end}", "one") == ""
+
+
+def test_nested_conditionals():
+    source = "{if args.1}a{if args.2}b{else}c{end}d{else}e{end}"
+    assert render(source, "x y") == "abd"
+    assert render(source, "x") == "acd"
+    assert render(source) == "e"
+
+
+@pytest.mark.parametrize(
+    "source",
+    ["{if args}never ends", "{else}", "{end}", "{if args}a{else}b{else}c{end}", "{if nope}x{end}"],
+)
+def test_broken_conditionals(source):
+    with pytest.raises(TemplateError):
+        compile_template(source)
@@ -0,0 +1,119 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+import asyncio
+import contextlib
+
+import pytest
+
+from utils.writebehind import WriteBehind
+
+
+class FakeDatabase:
+    """Keeps what a transaction ran only if the transaction finished"""
+
+    def __init__(self):
+        self.rows = []
+        self.fail = False
+        self.block = False
+        self._staged = []
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    @contextlib.asynccontextmanager
+    async def transaction(self):
+        self._staged = []
+        yield
+        self.rows.extend(self._staged)
+
+    async def execute_many(self, query, values):
+        if self.block:
+            self.started.set()
+            await self.release.wait()
+        if self.fail:
+            raise RuntimeError("disk I/O error")
+        self._staged.extend((query, value) for value in values)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_later_writes_replace_pending_ones():
+    async def main():
+        db = FakeDatabase()
+        writer = WriteBehind(db, loop=asyncio.get_running_loop())
+        writer.put(1, "upsert", {"id": 1, "v": "a"})
+        writer.put(2, "upsert", {"id": 2, "v": "b"})
+        writer.put(1, "delete", {"id": 1})
+        assert len(writer) == 2
+        await writer.flush()
+        return db.rows, len(writer)
+
+    rows, pending = run(main())
+    assert sorted(rows) == [("delete", {"id": 1}), ("upsert", {"id": 2, "v": "b"})]
+    assert pending == 0
+
+
+def test_failed_flush_keeps_newer_writes():
+    async def main():
+        db = FakeDatabase()
+        writer = WriteBehind(db, loop=asyncio.get_running_loop())
+        writer.put(1, "upsert", {"id": 1, "v": "old"})
+        writer.put(2, "upsert", {"id": 2, "v": "b"})
+        db.fail = db.block = True
+        flush = asyncio.ensure_future(writer.flush())
+        await db.started.wait()
+        writer.put(1, "upsert", {"id": 1, "v": "new"})
+        db.release.set()
+        with pytest.raises(RuntimeError):
+            await flush
+        db.fail = db.block = False
+        await writer.flush()
+        return db.rows
+
+    assert sorted(run(main()), key=lambda row: row[1]["id"]) == [
+        ("upsert", {"id": 1, "v": "new"}),
+        ("upsert", {"id": 2, "v": "b"}),
+    ]
+
+
+def test_cancelled_flush_puts_its_writes_back():
+    async def main():
+        db = FakeDatabase()
+        writer = WriteBehind(db, loop=asyncio.get_running_loop())
+        writer.put(1, "upsert", {"id": 1})
+        db.block = True
+        flush = asyncio.ensure_future(writer.flush())
+        await db.started.wait()
+        flush.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await flush
+        pending = len(writer)
+        db.block = False
+        await writer.flush()
+        return pending, db.rows
+
+    pending, rows = run(main())
+    assert pending == 1
+    assert rows == [("upsert", {"id": 1})]
+
+
+def test_close_lets_a_running_flush_finish():
+    async def main():
+        db = FakeDatabase()
+        writer = WriteBehind(db, max_pending=1, loop=asyncio.get_running_loop())
+        writer.start()
+        db.block = True
+        writer.put(1, "upsert", {"id": 1})
+        await db.started.wait()
+        close = asyncio.ensure_future(writer.close())
+        await asyncio.sleep(0)
+        writer.put(2, "upsert", {"id": 2})
+        db.release.set()
+        await close
+        return db.rows, len(writer)
+
+    rows, pending = run(main())
+    assert rows == [("upsert", {"id": 1}), ("upsert", {"id": 2})]
+    assert pending == 0
@@ -2,27 +2,86 @@
 # Licensed under MIT
 
 import logging
+from typing import Iterator
 
 
 log = logging.getLogger("chat_formatting")
-__all__ = ["pagify", "box"]
+__all__ = ["pagify", "box", "MESSAGE_LIMIT", "EMBED_DESCRIPTION_LIMIT"]
+
+MESSAGE_LIMIT: int = 2000
+EMBED_DESCRIPTION_LIMIT: int = 4096
+_FENCE: str = "```"
 
 
 def box(text: str, lang: str = "") -> str:
     return f"```{lang}\n{text}```"
 
 
-def pagify(text: str, page_length: int = 300) -> list:
-    in_text = text
-    ret = []
-    while len(in_text) > page_length:
-        p_len = page_length
-        delim = in_text.rfind("\n", 0, page_length)
-        delim = delim if delim != -1 else p_len
-        to_send = in_text[:delim]
-        if len(to_send.strip()) > 0:
-            ret.append(to_send)
-        in_text = in_text[delim:]
-    if len(in_text.strip()) > 0:
-        ret.append(in_text)
-    return ret
+def _fence_lang(text: str, fence: int) -> str:
+    """The language of the fence at ``fence``, taken from its whole opening line"""
+    start = fence + len(_FENCE)
+    newline = text.find("\n", start)
+    lang = text[start:newline] if newline != -1 else ""
+    return lang if lang.isidentifier() or lang.isalnum() else ""
+
+
+def pagify(text: str, page_length: int = 300, *, fences: bool = True) -> Iterator[str]:
+    """Split text into pages of at most ``page_length`` characters, preferably at newlines
+
+    This walks the text by offset so it's linear in the length of the text.
+    With ``fences`` a page that ends inside a code block has the block closed, and the
+    next page opens it again with the same language so every page renders correctly.
+    ``MESSAGE_LIMIT`` and ``EMBED_DESCRIPTION_LIMIT`` are Discord's page length caps
+    """
+    pos, length = 0, len(text)
+    lang = None  # The language of the code block we're in, None if we're not in one
+    while pos < length:
+        if lang is not None and text.startswith(_FENCE, pos):
+            # The block's closing fence was all that was left of it
+            lang = None
+            pos += len(_FENCE)
+            if text.startswith("\n", pos):
+                pos += 1
+            continue
+        opener = f"{_FENCE}{lang}\n" if lang is not None else ""
+        if length - pos <= page_length - len(opener):
+            if text[pos:].replace(_FENCE, "").strip():
+                yield opener + text[pos:]
+            return
+        end = pos + page_length - len(opener) - (len(_FENCE) if fences else 0)
+        if end <= pos:
+            raise ValueError("page_length is too small to fit a code block")
+        # Start looking after pos so a newline at the start of a page can't give an empty page
+        cut = text.rfind("\n", pos + 1, end)
+        if cut == -1:
+            cut = end
+            # Don't cut a fence in half
+            fence = text.rfind(_FENCE, max(pos, cut - 2), cut + 2)
+            if pos < fence < cut:
+                cut = fence
+        chunk = text[pos:cut]
+        count = chunk.count(_FENCE) if fences else 0
+        if count and (lang is not None) != (count % 2 == 1):
+            # The page opens a block, make sure some of the block actually fits on it
+            fence = text.rfind(_FENCE, pos, cut)
+            line_end = text.find("\n", fence)
+            if line_end == -1:
+                line_end = length
+            if not text[line_end:cut].strip():
+                if fence == pos:
+                    # Only the opening line fits, so open the block without a page
+                    lang = _fence_lang(text, fence)
+                    pos = line_end + 1
+                    continue
+                # Move the whole opening line to the next page
+                cut = fence - 1 if text.startswith("\n", fence - 1) else fence
+                chunk = text[pos:cut]
+                count -= 1
+        if count % 2:
+            lang = _fence_lang(text, text.rfind(_FENCE, pos, cut)) if lang is None else None
+        elif count and lang is not None:
+            # Closed the block and opened another one
+            lang = _fence_lang(text, text.rfind(_FENCE, pos, cut))
+        if chunk.replace(_FENCE, "").strip():
+            yield opener + chunk + (_FENCE if lang is not None else "")
+        pos = cut + 1 if text.startswith("\n", cut) else cut
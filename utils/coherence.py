@@ -0,0 +1,109 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from databases import Database
+
+import statements
+
+log = logging.getLogger("coherence")
+__all__ = ["CacheCoherence"]
+
+Key = Tuple[int, str]
+# Called with the keys that changed, or None when everything has to be reloaded
+Handler = Callable[[Optional[Set[Key]]], Awaitable[None]]
+
+
+class CacheCoherence:
+    """Keeps the managers' caches in step with writes made by other processes
+
+    Triggers on every cached table append the changed key to ``change_log``.
+    This polls ``PRAGMA data_version``, which only changes when the database was
+    written through another connection, and only then reads the new change log rows
+    and hands each manager the keys it cares about. Rows this process wrote itself
+    are skipped since the managers already updated their caches when writing them
+    """
+
+    # How often, in seconds, the change log is trimmed to its newest ``keep`` rows
+    trim_interval: float = 600.0
+
+    def __init__(
+        self,
+        reader: Database,
+        writer: Database,
+        *,
+        interval: float = 0.5,
+        keep: int = 100_000,
+        loop: asyncio.AbstractEventLoop = None,
+    ):
+        self.db = reader
+        self.writer = writer
+        self.interval = interval
+        self.keep = keep
+        self.loop = loop or asyncio.get_event_loop()
+        self.version: int = 0
+        self._handlers: Dict[str, Handler] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, scope: str, handler: Handler) -> None:
+        self._handlers[scope] = handler
+
+    async def start(self) -> None:
+        self.version = await self.db.fetch_val(statements.SELECT_CHANGE_LOG_VERSION) or 0
+        self._task = self.loop.create_task(self._run())
+
+    def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        # data_version is per connection so the same one has to be polled every time
+        async with self.db.connection() as conn:
+            raw = conn.raw_connection
+            data_version = None
+            last_trim = time.monotonic()
+            while True:
+                try:
+                    async with raw.execute("PRAGMA data_version") as cursor:
+                        (current,) = await cursor.fetchone()
+                    if current != data_version:
+                        data_version = current
+                        await self.poll()
+                    if time.monotonic() - last_trim > self.trim_interval:
+                        last_trim = time.monotonic()
+                        await self.writer.execute(statements.TRIM_CHANGE_LOG, {"keep": self.keep})
+                except Exception as e:
+                    log.exception("Failed to check for changes", exc_info=e)
+                await asyncio.sleep(self.interval)
+
+    async def poll(self) -> None:
+        """Apply every change logged since the last poll"""
+        oldest = await self.db.fetch_val(statements.SELECT_CHANGE_LOG_OLDEST)
+        if oldest is not None and oldest > self.version + 1:
+            # The log was trimmed past what we've seen so the changes are unknown
+            log.warning("Missed changes %s to %s, reloading the caches", self.version, oldest)
+            self.version = await self.db.fetch_val(statements.SELECT_CHANGE_LOG_VERSION)
+            for handler in self._handlers.values():
+                await handler(None)
+            return
+        top = await self.db.fetch_val(statements.SELECT_CHANGE_LOG_VERSION)
+        if top is None or top <= self.version:
+            return
+        # The origin is the pid, see storage._WriteConnection
+        values = {"version": self.version, "top": top, "origin": os.getpid()}
+        rows = await self.db.fetch_all(statements.SELECT_CHANGES, values)
+        self.version = top
+        changes: Dict[str, Set[Key]] = {}
+        for row in rows:
+            changes.setdefault(row["scope"], set()).add((row["key_id"], row["key_name"]))
+        for scope, keys in changes.items():
+            if handler := self._handlers.get(scope):
+                await handler(keys)
@@ -3,7 +3,7 @@
 
 from __future__ import annotations
 
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Optional
 
 import discord
 from discord.ext import commands  # type:ignore
@@ -17,12 +17,23 @@ class Context(commands.Context):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self.started_at: Optional[float] = None  # Set right before the command is invoked
         if TYPE_CHECKING:
             bot: Bot
 
+    async def send(self, content: Any = None, **kwargs: Any) -> discord.Message:
+        """Sends through the bot's outbound scheduler so replies can be queued and merged"""
+        outbound = getattr(self.bot, "outbound", None)
+        if outbound is None:
+            return await super().send(content, **kwargs)
+        return await outbound.send(self.channel, content, **kwargs)
+
     async def tick(self, *, check: bool = True) -> bool:
         emoji = "\N{WHITE HEAVY CHECK MARK}" if check else "\N{CROSS MARK}"
+        outbound = getattr(self.bot, "outbound", None)
         try:
+            if outbound is not None:
+                return await outbound.react(self.message, emoji)
             await self.message.add_reaction(emoji)
         except discord.HTTPException:
             return False
@@ -40,10 +51,10 @@ class Context(commands.Context):
         self,
         msg: str,
         *,
-        title: Optional[str] = discord.embeds.EmptyEmbed,
+        title: Optional[str] = None,
         use_title: bool = False,
     ) -> discord.Message:
-        if self.guild and not self.channel.permissions_for(ctx.me).embed_links:
+        if self.guild and not self.channel.permissions_for(self.me).embed_links:
             msg = msg if not use_title or not title else f"**{title}**\n{msg}"
             return await self.send(msg)
         return await self.send(embed=discord.Embed(title=title, description=msg, colour=0x00FFFF))
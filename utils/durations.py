@@ -0,0 +1,26 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import re
+from typing import Optional
+
+__all__ = ["parse_duration"]
+
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+_DURATION = re.compile(r"(\d+)([smhdw])")
+
+
+def parse_duration(text: str) -> Optional[float]:
+    """Parse durations like ``7d`` or ``1w2d12h`` into seconds, ``None`` if it isn't one"""
+    text = text.strip().lower()
+    pos, total = 0, 0
+    for match in _DURATION.finditer(text):
+        if match.start() != pos:
+            return None
+        total += int(match.group(1)) * _UNITS[match.group(2)]
+        pos = match.end()
+    if not pos or pos != len(text):
+        return None
+    return float(total)
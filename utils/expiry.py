@@ -0,0 +1,109 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+log = logging.getLogger("expiry")
+__all__ = ["ExpiryScheduler"]
+
+Handler = Callable[[List[Hashable]], Awaitable[None]]
+
+
+class ExpiryScheduler:
+    """Calls ``handler`` with keys once their deadlines pass, from a single task
+
+    Deadlines are unix timestamps kept in a min-heap, so scheduling is O(log n) and the
+    task only ever sleeps until the earliest one. Rescheduling or cancelling a key
+    leaves its old heap entry behind, it's skipped when popped since it no longer
+    matches :attr:`deadlines`, and the heap is rebuilt once those outnumber the live ones
+    """
+
+    def __init__(self, handler: Handler, *, max_sleep: float = 3600.0, retry_after: float = 30.0):
+        self.handler = handler
+        self.retry_after = retry_after
+        # Sleeping for at most this long means a change to the system clock is noticed
+        self.max_sleep = max_sleep
+        self.deadlines: Dict[Hashable, float] = {}
+        self._heap: List[Tuple[float, Hashable]] = []
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.deadlines)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def replace(self, entries: Iterable[Tuple[Hashable, float]]) -> None:
+        """Swap everything scheduled for ``(key, deadline)`` pairs"""
+        self.deadlines = dict(entries)
+        self._heap = [(when, key) for key, when in self.deadlines.items()]
+        heapq.heapify(self._heap)
+        self._wakeup.set()
+
+    def schedule(self, key: Hashable, when: float) -> None:
+        if self.deadlines.get(key) == when:
+            return
+        self.deadlines[key] = when
+        heapq.heappush(self._heap, (when, key))
+        if self._heap[0][0] == when:
+            self._wakeup.set()  # It's the new earliest deadline
+        self._maybe_compact()
+
+    def cancel(self, key: Hashable) -> None:
+        if self.deadlines.pop(key, None) is not None:
+            self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self.deadlines):
+            self._heap = [(when, key) for key, when in self.deadlines.items()]
+            heapq.heapify(self._heap)
+
+    def _pop_due(self, now: float) -> List[Hashable]:
+        heap, deadlines, due = self._heap, self.deadlines, []
+        while heap and heap[0][0] <= now:
+            when, key = heapq.heappop(heap)
+            if deadlines.get(key) == when:
+                del deadlines[key]
+                due.append(key)
+        return due
+
+    async def _run(self) -> None:
+        while True:
+            self._wakeup.clear()
+            if due := self._pop_due(time.time()):
+                try:
+                    await self.handler(due)
+                except Exception as e:
+                    log.exception(
+                        "Failed to expire %s entries, trying again soon", len(due), exc_info=e
+                    )
+                    retry = time.time() + self.retry_after
+                    for key in due:
+                        # Unless it was rescheduled meanwhile
+                        self.deadlines.setdefault(key, retry)
+                        if self.deadlines[key] == retry:
+                            heapq.heappush(self._heap, (retry, key))
+                continue
+            # Drop stale entries off the top so the sleep is for a live deadline
+            while self._heap and self.deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            delay = self.max_sleep
+            if self._heap:
+                delay = min(delay, max(self._heap[0][0] - time.time(), 0))
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,197 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+# A stand in for Discord, for running the bot without connecting to it. The
+# benchmarks use the HTTP side and offline clusters use the gateway side
+
+from __future__ import annotations
+
+import datetime
+import logging
+from typing import Any, Dict, Optional
+
+import discord
+
+log = logging.getLogger("fakegateway")
+__all__ = ["FakeGateway", "FakeHTTP"]
+
+BOT_ID = 10**17
+OWNER_ID = BOT_ID - 1
+_snowflake = BOT_ID
+
+
+def snowflake() -> int:
+    global _snowflake
+    _snowflake += 1
+    return _snowflake
+
+
+class FakeHTTP:
+    """Stands in for ``HTTPClient.request`` and answers every route locally"""
+
+    def __init__(self):
+        self.requests: Dict[str, int] = {}
+
+    async def request(self, route: discord.http.Route, **kwargs: Any) -> Any:
+        key = f"{route.method} {route.path}"
+        self.requests[key] = self.requests.get(key, 0) + 1
+        # What logging in asks for
+        if key == "GET /users/@me":
+            return user_payload(BOT_ID, bot=True)
+        if key == "GET /oauth2/applications/@me":
+            return application_payload()
+        if route.method in ("POST", "PATCH") and route.path.endswith("/messages") or (
+            route.method == "PATCH" and "/messages/" in route.path
+        ):
+            payload = kwargs.get("json") or {}
+            content = payload.get("content")
+            log.info("%s %s: %r", key, route.channel_id, content or payload.get("embeds"))
+            return message_payload(
+                route.channel_id, BOT_ID, content or "", guild_id=None, bot=True
+            )
+        return None
+
+
+# Payloads have every field that's always sent, newer discord.py versions index into
+# ones like a member's flags instead of .get()ing them
+
+
+def user_payload(user_id: int, *, bot: bool = False) -> Dict[str, Any]:
+    return {
+        "id": str(user_id),
+        "username": f"user{user_id}",
+        "global_name": None,
+        "discriminator": "0001",
+        "avatar": None,
+        "bot": bot,
+        "public_flags": 0,
+    }
+
+
+def application_payload() -> Dict[str, Any]:
+    return {
+        "id": str(BOT_ID),
+        "name": f"user{BOT_ID}",
+        "description": "",
+        "icon": None,
+        "rpc_origins": [],
+        "bot_public": False,
+        "bot_require_code_grant": False,
+        "owner": user_payload(OWNER_ID),
+        "team": None,
+        "verify_key": "",
+        "flags": 0,
+    }
+
+
+def member_payload(
+    joined_at: Optional[str], user_id: int = None, *, bot: bool = False
+) -> Dict[str, Any]:
+    data = {"roles": [], "joined_at": joined_at, "deaf": False, "mute": False, "flags": 0}
+    if user_id is not None:
+        data["user"] = user_payload(user_id, bot=bot)
+    return data
+
+
+def message_payload(
+    channel_id: int, author_id: int, content: str, *, guild_id: int = None, bot: bool = False
+) -> Dict[str, Any]:
+    data = {
+        "id": str(snowflake()),
+        "channel_id": str(channel_id),
+        "author": user_payload(author_id, bot=bot),
+        "content": content,
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "edited_timestamp": None,
+        "tts": False,
+        "mention_everyone": False,
+        "mentions": [],
+        "mention_roles": [],
+        "attachments": [],
+        "embeds": [],
+        "pinned": False,
+        "type": 0,
+    }
+    if guild_id is not None:
+        data["guild_id"] = str(guild_id)
+        data["member"] = member_payload(data["timestamp"])
+    return data
+
+
+def guild_payload(guild_id: int, channel_id: int) -> Dict[str, Any]:
+    return {
+        "id": str(guild_id),
+        "name": f"guild{guild_id}",
+        "owner_id": str(guild_id),
+        "roles": [
+            {
+                "id": str(guild_id),
+                "name": "@everyone",
+                "permissions": str(discord.Permissions.all().value),
+                "position": 0,
+                "color": 0,
+                "hoist": False,
+                "managed": False,
+                "mentionable": False,
+            }
+        ],
+        "channels": [{"id": str(channel_id), "type": 0, "name": "general", "position": 0}],
+        "members": [member_payload(None, BOT_ID, bot=True)],
+        "member_count": 1,
+        "emojis": [],
+        "stickers": [],
+        "features": [],
+    }
+
+
+class FakeGateway:
+    """Feeds the bot gateway events without connecting to Discord
+
+    Each of the bot's shards gets a guild with one channel. :meth:`inject` turns text
+    into a MESSAGE_CREATE from the owner, so commands run the whole way through and
+    their replies end up in the log instead of being sent
+    """
+
+    owner_id: int = OWNER_ID
+
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+        self.http = FakeHTTP()
+        self.guilds: Dict[int, int] = {}  # shard_id: guild_id
+        bot.http.request = self.http.request
+
+    async def login(self) -> None:
+        """Log in to the fake HTTP, which runs the bot's setup hook like a real login"""
+        await self.bot.login("offline")
+
+    def add_guild(self, guild_id: int, channel_id: int) -> discord.Guild:
+        """Add a guild with one text channel, the bot is its only member"""
+        # There's no public way to hand the library a guild, this is where GUILD_CREATE ends up
+        return self.bot._connection._add_guild_from_data(guild_payload(guild_id, channel_id))
+
+    def connect(self) -> None:
+        """Give every shard a guild and mark the bot ready, :meth:`login` has to be done first"""
+        bot = self.bot
+        bot.owner_id = self.owner_id
+        shard_count = bot.shard_count or 1
+        for shard_id in bot.shard_ids or range(shard_count):
+            # Guilds are put on shards by (guild_id >> 22) % shard_count
+            guild_id = ((shard_count * 1000 + shard_id) << 22) | 1
+            self.add_guild(guild_id, snowflake())
+            self.guilds[shard_id] = guild_id
+            bot.dispatch("shard_ready", shard_id)
+        bot._ready.set()
+        bot.dispatch("ready")
+        log.info("Fake gateway is ready with guilds %s", self.guilds)
+
+    def inject(
+        self, content: str, *, shard_id: Optional[int] = None, author_id: int = None
+    ) -> None:
+        """Dispatch a message as if someone had sent it in one of the shards' guilds"""
+        if shard_id is None:
+            guild_id = next(iter(self.guilds.values()))
+        else:
+            guild_id = self.guilds[shard_id]
+        channel = self.bot.get_guild(guild_id).text_channels[0]
+        data = message_payload(channel.id, author_id or self.owner_id, content, guild_id=guild_id)
+        self.bot._connection.parse_message_create(data)
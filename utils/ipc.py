@@ -0,0 +1,113 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from multiprocessing.connection import Connection
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+if TYPE_CHECKING:
+    from bot import Bot
+
+log = logging.getLogger("ipc")
+__all__ = ["ClusterIPC"]
+
+
+class ClusterIPC:
+    """A cluster's side of the pipe to the launcher
+
+    Messages are dicts with an ``op`` key. Anything sent with :meth:`broadcast` is
+    sent back by the launcher to every cluster, including this one, so owner commands
+    like ``shutdown`` and ``reload`` run the same way everywhere
+    """
+
+    def __init__(self, bot: Bot, conn: Connection, cluster_id: int, *, interval: float = 15.0):
+        self.bot = bot
+        self.conn = conn
+        self.cluster_id = cluster_id
+        self.interval = interval
+        self._send_lock = threading.Lock()
+        self._requests: Dict[int, asyncio.Future] = {}
+        self._nonce = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        loop = self.bot.loop
+        threading.Thread(
+            target=self._reader, args=(loop,), name=f"cluster-{self.cluster_id}-ipc", daemon=True
+        ).start()
+        self._task = loop.create_task(self._health_loop())
+
+    def close(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    def send(self, op: str, **data: Any) -> None:
+        with self._send_lock:
+            self.conn.send({"op": op, "cluster": self.cluster_id, **data})
+
+    def broadcast(self, op: str, **data: Any) -> None:
+        """Run an op on every cluster"""
+        self.send("broadcast", payload={"op": op, **data})
+
+    async def request(self, op: str, *, timeout: float = 5.0, **data: Any) -> Dict[str, Any]:
+        """Ask the launcher for something and wait for its reply"""
+        self._nonce += 1
+        nonce = self._nonce
+        fut = self._requests[nonce] = self.bot.loop.create_future()
+        self.send(op, nonce=nonce, **data)
+        try:
+            return await asyncio.wait_for(fut, timeout)
+        finally:
+            self._requests.pop(nonce, None)
+
+    def health(self) -> Dict[str, Any]:
+        bot = self.bot
+        return {
+            "shard_ids": bot.shard_ids,
+            "guilds": len(bot.guilds),
+            "latency": None if bot.latency != bot.latency else round(bot.latency * 1000, 2),
+            "ready": bot.is_ready(),
+        }
+
+    async def _health_loop(self) -> None:
+        while True:
+            try:
+                self.send("health", health=self.health())
+            except (OSError, EOFError) as e:
+                log.warning("Could not report health to the launcher: %s", e)
+            await asyncio.sleep(self.interval)
+
+    def _reader(self, loop: asyncio.AbstractEventLoop) -> None:
+        while True:
+            try:
+                msg = self.conn.recv()
+            except (OSError, EOFError):
+                log.warning("Lost the connection to the launcher, shutting down")
+                msg = {"op": "shutdown"}
+            loop.call_soon_threadsafe(self._dispatch, msg)
+            if msg["op"] == "shutdown":
+                return
+
+    async def _reload(self, extension: str) -> None:
+        try:
+            await self.bot.reload_extension(extension)
+        except Exception as e:
+            log.exception("Failed to reload %s", extension, exc_info=e)
+
+    def _dispatch(self, msg: Dict[str, Any]) -> None:
+        op = msg["op"]
+        if (nonce := msg.get("nonce")) is not None and (fut := self._requests.get(nonce)):
+            if not fut.done():
+                fut.set_result(msg)
+        elif op == "shutdown":
+            self.bot.loop.create_task(self.bot.shutdown())
+        elif op == "reload":
+            self.bot.loop.create_task(self._reload(msg["extension"]))
+        elif op == "inject" and self.bot.gateway is not None:
+            self.bot.gateway.inject(msg["content"])
+        else:
+            log.debug("Ignoring unknown op %r", op)
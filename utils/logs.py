@@ -0,0 +1,79 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import datetime
+import json
+import logging
+import logging.handlers
+import random
+from typing import Dict
+
+__all__ = ["JSONFormatter", "LazyQueueHandler", "SamplingFilter"]
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """A QueueHandler which leaves the formatting to the listener's thread
+
+    The stock one runs the formatter (timestamps, tracebacks) before queueing the record
+    so that it can be pickled, which isn't needed when the queue never leaves the
+    process. Only the message itself is rendered here so later changes to its
+    arguments don't show up in the log
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+class JSONFormatter(logging.Formatter):
+    """Formats records as JSON lines"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        created = datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc)
+        data = {
+            "time": created.isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            data["exc_info"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            data["stack_info"] = self.formatStack(record.stack_info)
+        return json.dumps(data, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """Only lets a share of the records below WARNING through for the given loggers
+
+    ``rates`` maps logger names to the share to keep, and applies to their children too,
+    so ``{"discord.gateway": 0.1}`` keeps a tenth of the gateway's info and debug logs
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self._resolved: Dict[str, float] = {}
+
+    def _rate(self, name: str) -> float:
+        try:
+            return self._resolved[name]
+        except KeyError:
+            pass
+        parent, rate = name, 1.0
+        while parent:
+            if parent in self.rates:
+                rate = self.rates[parent]
+                break
+            parent = parent.rpartition(".")[0]
+        self._resolved[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or random.random() < rate
@@ -0,0 +1,148 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import logging
+import time
+from typing import Callable, Dict, Iterable, List, Tuple
+
+log = logging.getLogger("metrics")
+__all__ = ["Histogram", "MetricsRegistry", "LATENCY_BUCKETS"]
+
+Labels = Tuple[Tuple[str, str], ...]
+# Seconds, from 0.5ms to 10s
+LATENCY_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+
+def _format_labels(labels: Labels, extra: str = "") -> str:
+    parts = [f'{k}="{v}"' for k, v in labels]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Histogram:
+    """A fixed bucket histogram, which is cheap enough to observe on every call"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0.0
+        self.count: int = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket it falls in"""
+        if not self.count:
+            return 0.0
+        target, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    """Counters, gauges and histograms, rendered in the Prometheus text format
+
+    Gauges are read from callbacks when the metrics are rendered so things like cache
+    sizes don't have to be kept up to date by hand
+    """
+
+    def __init__(self, prefix: str = "yesbot"):
+        self.prefix = prefix
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.gauges: Dict[str, Callable[[], Iterable[Tuple[Labels, float]]]] = {}
+        self.help: Dict[str, str] = {}
+        self.loop_lag: float = 0.0
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        series = self.counters.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        series = self.histograms.setdefault(name, {})
+        key = tuple(sorted(labels.items()))
+        try:
+            series[key].observe(value)
+        except KeyError:
+            hist = series[key] = Histogram()
+            hist.observe(value)
+
+    def gauge(
+        self, name: str, callback: Callable[[], Iterable[Tuple[Labels, float]]], help: str = ""
+    ) -> None:
+        self.gauges[name] = callback
+        if help:
+            self.help[name] = help
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, series in self.counters.items():
+            full = f"{self.prefix}_{name}_total"
+            lines.append(f"# TYPE {full} counter")
+            lines.extend(f"{full}{_format_labels(k)} {v}" for k, v in series.items())
+        for name, callback in self.gauges.items():
+            full = f"{self.prefix}_{name}"
+            if name in self.help:
+                lines.append(f"# HELP {full} {self.help[name]}")
+            lines.append(f"# TYPE {full} gauge")
+            try:
+                lines.extend(f"{full}{_format_labels(k)} {v}" for k, v in callback())
+            except Exception as e:
+                log.exception("Could not read gauge %s", name, exc_info=e)
+        for name, series in self.histograms.items():
+            full = f"{self.prefix}_{name}"
+            lines.append(f"# TYPE {full} histogram")
+            for labels, hist in series.items():
+                total = 0
+                for bound, count in zip((*hist.buckets, "+Inf"), hist.counts):
+                    total += count
+                    le = _format_labels(labels, f'le="{bound}"')
+                    lines.append(f"{full}_bucket{le} {total}")
+                lines.append(f"{full}_sum{_format_labels(labels)} {hist.sum}")
+                lines.append(f"{full}_count{_format_labels(labels)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    async def monitor_loop_lag(self, interval: float = 0.5) -> None:
+        """Measure how late the event loop wakes up from a sleep, forever"""
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag = max(time.perf_counter() - start - interval, 0.0)
+            self.loop_lag = lag
+            self.observe("event_loop_lag_seconds", lag)
+
+    async def serve(self, host: str = "127.0.0.1", port: int = 9100) -> asyncio.AbstractServer:
+        """Serve the metrics over plain HTTP for Prometheus to scrape"""
+
+        async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+            try:
+                await reader.readuntil(b"\r\n\r\n")
+                body = self.render().encode()
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                    + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                    + body
+                )
+                await writer.drain()
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        return await asyncio.start_server(handle, host, port)
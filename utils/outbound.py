@@ -0,0 +1,185 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import asyncio
+import enum
+import heapq
+import itertools
+import logging
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
+
+import discord
+
+from .chat_formatting import MESSAGE_LIMIT
+
+log = logging.getLogger("outbound")
+__all__ = ["OutboundScheduler", "Priority"]
+
+
+class Priority(enum.IntEnum):
+    REPLY = 0
+    EDIT = 1
+    REACTION = 2  # Ticks and such, nobody is waiting on these
+
+
+class _Job:
+    __slots__ = ("kind", "target", "content", "kwargs", "futures")
+
+    def __init__(self, kind: str, target: Any, content: Optional[str], kwargs: Dict[str, Any]):
+        self.kind = kind
+        self.target = target
+        self.content = content
+        self.kwargs = kwargs
+        self.futures: List[asyncio.Future] = []
+
+    @property
+    def mergeable(self) -> bool:
+        return self.kind == "send" and self.content is not None and not self.kwargs
+
+
+class _ChannelQueue:
+    __slots__ = ("heap", "edits", "reactions", "worker")
+
+    def __init__(self):
+        self.heap: List[Tuple[int, int, _Job]] = []
+        self.edits: Dict[int, _Job] = {}  # message id -> pending edit
+        self.reactions: Dict[Tuple[int, str], _Job] = {}  # (message id, emoji) -> pending reaction
+        self.worker: Optional[asyncio.Task] = None
+
+
+class OutboundScheduler:
+    """Queues sends, edits and reactions per channel so a channel only has one request in flight
+
+    Every channel gets its own worker which drains that channel's queue in priority order,
+    so replies go out before edits and edits go out before reactions. Plain text sends
+    queued behind each other are merged into one message while they fit in
+    ``MESSAGE_LIMIT``, a pending edit to a message absorbs later edits to it, and adding
+    the same reaction twice only costs one request. Once a channel has ``max_queue`` jobs
+    waiting reactions are dropped instead of queued
+
+    Workers only exist while their channel has something queued
+    """
+
+    def __init__(self, *, max_queue: int = 50):
+        self.max_queue = max_queue
+        self._queues: Dict[int, _ChannelQueue] = {}
+        self._counter = itertools.count()
+        self.requests = 0
+        self.merged = 0
+        self.dropped = 0
+
+    def __len__(self) -> int:
+        return sum(len(q.heap) for q in self._queues.values())
+
+    async def send(
+        self, channel: discord.abc.Messageable, content: Any = None, **kwargs: Any
+    ) -> discord.Message:
+        kwargs = {k: v for k, v in kwargs.items() if v is not None}
+        job = _Job("send", channel, None if content is None else str(content), kwargs)
+        return await self._push(channel.id, Priority.REPLY, job)
+
+    async def edit(self, message: discord.Message, **kwargs: Any) -> discord.Message:
+        queue = self._queues.get(message.channel.id)
+        if queue is not None and (pending := queue.edits.get(message.id)) is not None:
+            pending.kwargs.update(kwargs)  # The later edit wins for whatever it touches
+            return await self._wait(pending)
+        job = _Job("edit", message, None, kwargs)
+        return await self._push(message.channel.id, Priority.EDIT, job)
+
+    async def react(self, message: discord.Message, emoji: Union[discord.Emoji, str]) -> bool:
+        """Add a reaction, returns ``False`` if the channel was too busy to bother"""
+        key = (message.id, str(emoji))
+        queue = self._queues.get(message.channel.id)
+        if queue is not None:
+            if (pending := queue.reactions.get(key)) is not None:
+                await self._wait(pending)
+                return True
+            if len(queue.heap) >= self.max_queue:
+                self.dropped += 1
+                return False
+        job = _Job("react", message, str(emoji), {"emoji": emoji})
+        await self._push(message.channel.id, Priority.REACTION, job)
+        return True
+
+    def close(self) -> None:
+        for queue in self._queues.values():
+            if queue.worker is not None:
+                queue.worker.cancel()
+            for _, _, job in queue.heap:
+                for fut in job.futures:
+                    fut.cancel()
+        self._queues.clear()
+
+    async def _push(self, channel_id: int, priority: Priority, job: _Job) -> Any:
+        queue = self._queues.get(channel_id)
+        if queue is None:
+            queue = self._queues[channel_id] = _ChannelQueue()
+        if job.kind == "edit":
+            queue.edits[job.target.id] = job
+        elif job.kind == "react":
+            queue.reactions[(job.target.id, job.content)] = job
+        heapq.heappush(queue.heap, (priority, next(self._counter), job))
+        if queue.worker is None:
+            queue.worker = asyncio.get_running_loop().create_task(self._drain(channel_id, queue))
+        return await self._wait(job)
+
+    @staticmethod
+    async def _wait(job: _Job) -> Any:
+        fut = asyncio.get_running_loop().create_future()
+        job.futures.append(fut)
+        return await fut
+
+    async def _drain(self, channel_id: int, queue: _ChannelQueue) -> None:
+        try:
+            while queue.heap:
+                # Give anything queued in the same tick a chance to be merged
+                await asyncio.sleep(0)
+                _, _, job = heapq.heappop(queue.heap)
+                jobs = [job]
+                if job.mergeable:
+                    size = len(job.content)
+                    while queue.heap and queue.heap[0][2].mergeable:
+                        nxt = queue.heap[0][2]
+                        if size + 1 + len(nxt.content) > MESSAGE_LIMIT:
+                            break
+                        heapq.heappop(queue.heap)
+                        size += 1 + len(nxt.content)
+                        jobs.append(nxt)
+                    self.merged += len(jobs) - 1
+                await self._run(queue, jobs)
+        finally:
+            queue.worker = None
+            if self._queues.get(channel_id) is queue and not queue.heap:
+                del self._queues[channel_id]
+
+    async def _run(self, queue: _ChannelQueue, jobs: List[_Job]) -> None:
+        job = jobs[0]
+        if job.kind == "edit":
+            del queue.edits[job.target.id]
+        elif job.kind == "react":
+            del queue.reactions[(job.target.id, job.content)]
+        self.requests += 1
+        try:
+            if job.kind == "send":
+                content = "\n".join(j.content for j in jobs) if len(jobs) > 1 else job.content
+                result = await job.target.send(content, **job.kwargs)
+            elif job.kind == "edit":
+                result = await job.target.edit(**job.kwargs)
+            else:
+                result = await job.target.add_reaction(job.kwargs["emoji"])
+        except asyncio.CancelledError:
+            for fut in self._futures(jobs):
+                fut.cancel()
+            raise
+        except Exception as e:
+            for fut in self._futures(jobs):
+                fut.set_exception(e)
+        else:
+            for fut in self._futures(jobs):
+                fut.set_result(result)
+
+    @staticmethod
+    def _futures(jobs: List[_Job]) -> Iterator[asyncio.Future]:
+        return (fut for job in jobs for fut in job.futures if not fut.done())
@@ -0,0 +1,162 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import datetime
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+
+import discord
+
+from .context import Context
+
+log = logging.getLogger("paginator")
+__all__ = ["Page", "PageSource", "Paginator"]
+
+_PREFIX = "pages"
+_VS16 = "\N{VARIATION SELECTOR-16}"
+_BUTTONS = (
+    ("first", "\N{BLACK LEFT-POINTING DOUBLE TRIANGLE}", discord.ButtonStyle.grey),
+    ("prev", "\N{BLACK LEFT-POINTING TRIANGLE}" + _VS16, discord.ButtonStyle.grey),
+    ("stop", "\N{HEAVY MULTIPLICATION X}" + _VS16, discord.ButtonStyle.red),
+    ("next", "\N{BLACK RIGHT-POINTING TRIANGLE}" + _VS16, discord.ButtonStyle.grey),
+    ("last", "\N{BLACK RIGHT-POINTING DOUBLE TRIANGLE}", discord.ButtonStyle.grey),
+)
+
+
+class Page(NamedTuple):
+    index: int
+    count: int
+    text: str
+    # Whatever the source needs to find the pages next to this one
+    cursor: Any = None
+
+
+class PageSource:
+    """Where a menu's pages come from
+
+    A source is registered once under its :attr:`name` and serves every menu of its
+    kind. Menus only remember the ``key`` they were started with (a guild id and such)
+    and, while the paginator still has it, the page they're showing
+    """
+
+    name: str
+    title: str
+    denied: str = "Only the author of the command can interact with this"
+
+    async def get_page(self, key: int, index: int, shown: Optional[Page] = None) -> Optional[Page]:
+        """Get the page at ``index`` wrapped around into range, or ``None`` if there are no pages
+
+        ``shown`` is the page the menu is on, without its text, if the paginator still
+        remembers it. Its ``cursor`` can be used to find the pages on either side of it
+        """
+        raise NotImplementedError
+
+    async def check(self, inter: discord.Interaction, author_id: int) -> bool:
+        return inter.user.id == author_id
+
+
+class Paginator:
+    """Sends paginated menus and handles every click on them
+
+    A menu's buttons' custom ids hold the source, the command's author, the key and
+    the page it's on. That's all that's needed to show any page, so menus never time
+    out and keep working after a restart as long as their source is registered.
+    The page each of the last ``max_menus`` menus is on is also kept, so sources can
+    find the next one from there instead of from the start
+    """
+
+    def __init__(self, max_menus: int = 1000):
+        self.sources: Dict[str, PageSource] = {}
+        self.max_menus = max_menus
+        # Message id -> the page it's showing, without the text
+        self._shown: OrderedDict[int, Page] = OrderedDict()
+
+    def register(self, source: PageSource) -> None:
+        self.sources[source.name] = source
+
+    def unregister(self, name: str) -> None:
+        self.sources.pop(name, None)
+
+    def _remember(self, message_id: int, page: Page) -> None:
+        self._shown[message_id] = page._replace(text="")
+        self._shown.move_to_end(message_id)
+        while len(self._shown) > self.max_menus:
+            self._shown.popitem(last=False)
+
+    async def start(self, ctx: Context, name: str, key: int) -> Optional[discord.Message]:
+        """Send the first page of a menu, returns ``None`` if the source has no pages"""
+        source = self.sources[name]
+        if (page := await source.get_page(key, 0)) is None:
+            return None
+        embeds = not ctx.guild or ctx.channel.permissions_for(ctx.me).embed_links
+        kwargs = self._render(source, page, ctx.author.id, key, embeds)
+        msg = await ctx.send(**kwargs)
+        # Sending a view always stores it in the library, stopping it takes it out again
+        kwargs["view"].stop()
+        self._remember(msg.id, page)
+        return msg
+
+    def _render(
+        self, source: PageSource, page: Page, author_id: int, key: int, embeds: bool
+    ) -> dict:
+        view = discord.ui.View(timeout=None)
+        for action, emoji, style in _BUTTONS:
+            custom_id = f"{_PREFIX}:{source.name}:{author_id}:{key}:{page.index}:{action}"
+            view.add_item(discord.ui.Button(emoji=emoji, style=style, custom_id=custom_id))
+        footer = f"Page {page.index + 1}/{page.count}"
+        if not embeds:
+            content = f"**{source.title}**\n{page.text}\n{footer}"
+            return {"content": content, "embed": None, "view": view}
+        embed = discord.Embed(
+            title=source.title,
+            colour=0x00FFFF,
+            description=page.text,
+            timestamp=datetime.datetime.now(tz=datetime.timezone.utc),
+        ).set_footer(text=footer)
+        return {"content": None, "embed": embed, "view": view}
+
+    async def on_interaction(self, inter: discord.Interaction) -> None:
+        if inter.type is not discord.InteractionType.component:
+            return
+        prefix, _, rest = (inter.data or {}).get("custom_id", "").partition(":")
+        if prefix != _PREFIX:
+            return
+        try:
+            name, author_id, key, index, action = rest.split(":")
+            author_id, key, index = int(author_id), int(key), int(index)
+        except ValueError:
+            return
+        if (source := self.sources.get(name)) is None:
+            await inter.response.send_message(
+                "This menu isn't available right now", ephemeral=True
+            )
+            return
+        if not await source.check(inter, author_id):
+            await inter.response.send_message(source.denied, ephemeral=True)
+            return
+        if action == "stop":
+            self._shown.pop(inter.message.id, None)
+            await inter.response.defer()
+            await inter.message.delete()
+            return
+        wanted = {"first": 0, "prev": index - 1, "next": index + 1, "last": -1}.get(action)
+        if wanted is None:
+            return
+        shown = self._shown.get(inter.message.id)
+        if shown is not None and shown.index != index:
+            shown = None  # Not what the buttons say the menu is showing
+        if (page := await source.get_page(key, wanted, shown)) is None:
+            self._shown.pop(inter.message.id, None)
+            await inter.response.edit_message(
+                content="There's nothing here anymore", embed=None, view=None
+            )
+            return
+        embeds = inter.guild is None or inter.app_permissions.embed_links
+        kwargs = self._render(source, page, author_id, key, embeds)
+        # Editing only stores a view that's still running, so this one is stopped first
+        kwargs["view"].stop()
+        await inter.response.edit_message(**kwargs)
+        self._remember(inter.message.id, page)
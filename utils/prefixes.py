@@ -0,0 +1,56 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Tuple
+
+__all__ = ["PrefixMatcher"]
+
+
+class PrefixMatcher:
+    """A precompiled set of prefixes for a single guild
+
+    Prefixes are sorted longest first so that overlapping prefixes (``!`` and ``!!``)
+    resolve to the longest one, and the first characters are kept in a set so that
+    messages that can't be commands are rejected with a single lookup
+    """
+
+    __slots__ = ("prefixes", "_first_chars", "_with_mentions")
+
+    def __init__(self, prefixes: Iterable[str]):
+        self.prefixes: Tuple[str, ...] = tuple(
+            sorted({p for p in prefixes if p}, key=len, reverse=True)
+        )
+        self._first_chars = frozenset(p[0] for p in self.prefixes)
+        self._with_mentions: Dict[int, List[str]] = {}
+
+    def __repr__(self) -> str:
+        return f"<PrefixMatcher prefixes={self.prefixes!r}>"
+
+    @staticmethod
+    def mentions(user_id: int) -> Tuple[str, str]:
+        return f"<@{user_id}> ", f"<@!{user_id}> "
+
+    def match(self, content: str, user_id: Optional[int] = None) -> Optional[str]:
+        """Return the prefix the content starts with, if any"""
+        if not content:
+            return None
+        first = content[0]
+        if first in self._first_chars:
+            for prefix in self.prefixes:
+                if content.startswith(prefix):
+                    return prefix
+        if first == "<" and user_id is not None:
+            for mention in self.mentions(user_id):
+                if content.startswith(mention):
+                    return mention
+        return None
+
+    def with_mentions(self, user_id: int) -> List[str]:
+        """The prefixes along with the bot's mentions, built once per matcher"""
+        try:
+            return self._with_mentions[user_id]
+        except KeyError:
+            ret = self._with_mentions[user_id] = [*self.mentions(user_id), *self.prefixes]
+            return ret
@@ -0,0 +1,75 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import time
+from array import array
+from typing import Dict, Hashable, List, Optional
+
+__all__ = ["TokenBuckets"]
+
+
+class TokenBuckets:
+    """A set of token buckets sharing one rate, stored in flat arrays
+
+    Buckets refill lazily when they're checked, so there are no timers, and buckets
+    which have been idle long enough to be full again are dropped every so often.
+    Freed slots are reused so the arrays only grow to the most buckets in use at once
+    """
+
+    __slots__ = (
+        "rate", "capacity", "idle", "_slots", "_tokens", "_stamps", "_free", "_last_sweep"
+    )
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        # Long enough for an empty bucket to refill, after which forgetting it changes nothing
+        self.idle = capacity / rate
+        self._slots: Dict[Hashable, int] = {}
+        self._tokens = array("d")
+        self._stamps = array("d")
+        self._free: List[int] = []
+        self._last_sweep = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def consume(self, key: Hashable, cost: float = 1.0, now: Optional[float] = None) -> bool:
+        """Take ``cost`` tokens from a bucket, returning False if there aren't enough"""
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_sweep > self.idle:
+            self.sweep(now)
+        tokens, stamps = self._tokens, self._stamps
+        slot = self._slots.get(key)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+                tokens[slot] = self.capacity
+                stamps[slot] = now
+            else:
+                slot = len(tokens)
+                tokens.append(self.capacity)
+                stamps.append(now)
+            self._slots[key] = slot
+            available = self.capacity
+        else:
+            available = min(self.capacity, tokens[slot] + (now - stamps[slot]) * self.rate)
+        stamps[slot] = now
+        if available < cost:
+            tokens[slot] = available
+            return False
+        tokens[slot] = available - cost
+        return True
+
+    def sweep(self, now: Optional[float] = None) -> None:
+        """Forget the buckets that have been idle long enough to be full"""
+        if now is None:
+            now = time.monotonic()
+        self._last_sweep = now
+        stamps, idle = self._stamps, self.idle
+        stale = [key for key, slot in self._slots.items() if now - stamps[slot] >= idle]
+        for key in stale:
+            self._free.append(self._slots.pop(key))
@@ -0,0 +1,110 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import heapq
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+__all__ = ["TrigramIndex"]
+
+# Rough cost of a name's entry and of each of its posting list entries, which is what
+# 50k random names of 4-20 characters came out at with tracemalloc
+_NAME_BYTES: int = 100
+_POSTING_BYTES: int = 80
+
+
+def _trigrams(text: str) -> Set[str]:
+    padded = f"  {text.lower()} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """An in-memory trigram index for fuzzy matching short strings like tag names
+
+    Candidates are found through the posting lists of the query's trigrams and ranked
+    by trigram similarity, so a lookup never has to look at every name
+    """
+
+    # How many names get scored at most, which bounds the cost of a lookup
+    max_candidates: int = 512
+
+    __slots__ = ("_postings", "_counts", "nbytes")
+
+    def __init__(self, names: Iterable[str] = ()):
+        self._postings: Dict[str, Set[str]] = {}
+        self._counts: Dict[str, int] = {}
+        # Roughly how much memory the index takes, kept up to date as names come and go
+        self.nbytes: int = 0
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._counts
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._counts)
+
+    def add(self, name: str) -> None:
+        if name in self._counts:
+            return
+        grams = _trigrams(name)
+        self._counts[name] = len(grams)
+        self.nbytes += _NAME_BYTES + _POSTING_BYTES * len(grams)
+        for gram in grams:
+            try:
+                self._postings[gram].add(name)
+            except KeyError:
+                self._postings[gram] = {name}
+
+    def remove(self, name: str) -> None:
+        if (count := self._counts.pop(name, None)) is None:
+            return
+        self.nbytes -= _NAME_BYTES + _POSTING_BYTES * count
+        for gram in _trigrams(name):
+            names = self._postings.get(gram)
+            if names is None:
+                continue
+            names.discard(name)
+            if not names:
+                del self._postings[gram]
+
+    def search(
+        self, query: str, limit: int = 10, threshold: float = 0.0
+    ) -> List[Tuple[str, float]]:
+        """Return up to ``limit`` ``(name, score)`` pairs, best first
+
+        The score is the Jaccard similarity of the trigram sets, bumped up for names
+        that contain the query outright
+        """
+        query = query.lower()
+        grams = _trigrams(query)
+        postings = sorted((p for g in grams if (p := self._postings.get(g))), key=len)
+        if not postings:
+            return []
+        # A close match shares most of the query's trigrams, so it's bound to show up
+        # in the rarer half of the posting lists. Those are the cheap ones to merge, and
+        # the names in most of them are the ones worth scoring
+        shared_rare: Counter = Counter()
+        for names in postings[: max(len(postings) // 2, 2)]:
+            shared_rare.update(names)
+        if len(shared_rare) > self.max_candidates:
+            rank = shared_rare.__getitem__
+            candidates = heapq.nlargest(self.max_candidates, shared_rare, key=rank)
+        else:
+            candidates = list(shared_rare)
+        total = len(grams)
+        ret = []
+        for name in candidates:
+            shared = sum(name in names for names in postings)
+            score = shared / (total + self._counts[name] - shared)
+            if query in name:
+                score = (score + 1) / 2
+            if score >= threshold:
+                ret.append((name, score))
+        ret.sort(key=lambda x: (-x[1], x[0]))
+        return ret[:limit]
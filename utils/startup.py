@@ -0,0 +1,144 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+log = logging.getLogger("startup")
+__all__ = ["Startup", "StartupError"]
+
+
+class StartupError(RuntimeError):
+    """A required startup stage failed"""
+
+
+class _Stage:
+    __slots__ = ("name", "func", "after", "required")
+
+    def __init__(
+        self, name: str, func: Callable[[], Awaitable[Any]], after: Tuple[str, ...], required: bool
+    ):
+        self.name = name
+        self.func = func
+        self.after = after
+        self.required = required
+
+
+class Startup:
+    """Runs the bot's startup stages concurrently, each one as soon as its dependencies are done
+
+    :attr:`ready` is set once every stage has finished, which is what command dispatch
+    waits on. A stage that fails is logged and the stages depending on it are skipped.
+    If it's ``required`` every stage still running is cancelled as well and :meth:`run`
+    raises :class:`StartupError`
+    """
+
+    def __init__(self):
+        self._stages: Dict[str, _Stage] = {}
+        self.ready = asyncio.Event()
+        self.started_at: Optional[float] = None
+        # Stage name -> (started, finished) in seconds since the startup began
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self.failed: Dict[str, BaseException] = {}
+        self.skipped: Set[str] = set()
+        self.total: Optional[float] = None
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], Awaitable[Any]],
+        *,
+        after: Iterable[str] = (),
+        required: bool = False,
+    ) -> None:
+        if name in self._stages:
+            raise ValueError(f"There's already a stage called {name!r}")
+        self._stages[name] = _Stage(name, func, tuple(after), required)
+
+    def _check(self) -> None:
+        state: Dict[str, int] = {}  # 1 while visiting, 2 once done
+
+        def visit(name: str) -> None:
+            if state.get(name) == 2:
+                return
+            elif state.get(name) == 1:
+                raise ValueError(f"Stage {name!r} depends on itself")
+            state[name] = 1
+            for dep in self._stages[name].after:
+                if dep not in self._stages:
+                    raise ValueError(f"Stage {name!r} depends on unknown stage {dep!r}")
+                visit(dep)
+            state[name] = 2
+
+        for name in self._stages:
+            visit(name)
+
+    async def run(self) -> None:
+        self._check()
+        self.started_at = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_stage(stage: _Stage) -> None:
+            for dep in stage.after:
+                await tasks[dep]
+                if dep in self.failed or dep in self.skipped:
+                    log.warning("Skipping %s because %s didn't start", stage.name, dep)
+                    self.skipped.add(stage.name)
+                    return
+            started = time.perf_counter() - self.started_at
+            try:
+                await stage.func()
+            except asyncio.CancelledError:
+                self.skipped.add(stage.name)
+                raise
+            except Exception as e:
+                log.exception("Startup stage %s failed", stage.name, exc_info=e)
+                self.failed[stage.name] = e
+                if stage.required:
+                    # The startup has failed, don't wait on stages which might never finish
+                    for task in tasks.values():
+                        if task is not asyncio.current_task():
+                            task.cancel()
+            finally:
+                self.timings[stage.name] = (started, time.perf_counter() - self.started_at)
+
+        for name, stage in self._stages.items():
+            tasks[name] = asyncio.ensure_future(run_stage(stage))
+        await asyncio.wait(tasks.values())
+        for name, task in tasks.items():
+            if task.cancelled() and name not in self.failed:
+                self.skipped.add(name)
+        self.total = time.perf_counter() - self.started_at
+        required = [name for name in self.failed if self._stages[name].required]
+        required += [name for name in self.skipped if self._stages[name].required]
+        if required:
+            raise StartupError(f"Required startup stages failed: {', '.join(required)}")
+        self.ready.set()
+
+    async def wait(self) -> None:
+        await self.ready.wait()
+
+    def durations(self) -> Dict[str, float]:
+        return {name: end - start for name, (start, end) in self.timings.items()}
+
+    def report(self) -> str:
+        """A table of when each stage started and how long it took, in milliseconds"""
+        width = max(map(len, self._stages), default=0)
+        lines: List[str] = []
+        for name, (start, end) in sorted(self.timings.items(), key=lambda x: x[1]):
+            status = ""
+            if name in self.failed:
+                status = " (failed)"
+            elif name in self.skipped:
+                status = " (cancelled)"
+            took = (end - start) * 1000
+            lines.append(f"{name:<{width}}  +{start * 1000:7.1f}ms  {took:7.1f}ms{status}")
+        skipped = sorted(self.skipped - self.timings.keys())
+        lines.extend(f"{name:<{width}}  skipped" for name in skipped)
+        if self.total is not None:
+            lines.append(f"{'total':<{width}}  {'':>10}  {self.total * 1000:7.1f}ms")
+        return "\n".join(lines)
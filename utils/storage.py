@@ -0,0 +1,212 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import pathlib
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from databases import Database
+
+import migrations
+import statements
+from utils.coherence import CacheCoherence
+from utils.metrics import MetricsRegistry
+
+log = logging.getLogger("storage")
+__all__ = ["Storage"]
+
+# The files each table used to live in before everything was moved into one database
+LEGACY_FILES: Tuple[Tuple[str, str, str], ...] = (
+    ("prefixes.db", "guild_prefixes", "guild_id, prefixes"),
+    ("blacklist.db", "blacklist", "user_id, reason"),
+    ("tags.db", "tags", "guild_id, name, author_id, response"),
+)
+
+
+class _WriteConnection(sqlite3.Connection):
+    # databases opens a new connection for every task that uses one, so only what's
+    # needed per connection is set here. WAL is stored in the file by _prepare and
+    # sqlite3's own timeout already waits on locks
+    pragmas: Tuple[str, ...] = ("PRAGMA synchronous=NORMAL",)
+    # Whether change_log rows written through this connection are marked as ours
+    marks_changes: bool = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for pragma in self.pragmas:
+            self.execute(pragma)
+        if self.marks_changes:
+            self.execute(statements.CREATE_CHANGE_LOG_ORIGIN_TRIGGER.format(origin=os.getpid()))
+
+
+class _ReadConnection(_WriteConnection):
+    pragmas = ("PRAGMA query_only=ON",)
+    marks_changes = False
+
+
+# Statements are timed under their name in statements.py to keep the label count down
+_STATEMENT_NAMES: Dict[str, str] = {
+    value: name
+    for name, value in vars(statements).items()
+    if name.isupper() and isinstance(value, str)
+}
+
+
+class _TimedDatabase(Database):
+    """A Database which records how long each statement takes"""
+
+    def __init__(self, url: str, *, metrics: Optional[MetricsRegistry], **options: Any):
+        super().__init__(url, **options)
+        self.metrics = metrics
+
+    def _observe(self, query: Any, start: float) -> None:
+        if self.metrics is not None:
+            name = _STATEMENT_NAMES.get(query, "other") if isinstance(query, str) else "other"
+            self.metrics.observe("db_query_seconds", time.perf_counter() - start, statement=name)
+
+    async def fetch_all(self, query, values=None):
+        start = time.perf_counter()
+        try:
+            return await super().fetch_all(query, values)
+        finally:
+            self._observe(query, start)
+
+    async def fetch_one(self, query, values=None):
+        start = time.perf_counter()
+        try:
+            return await super().fetch_one(query, values)
+        finally:
+            self._observe(query, start)
+
+    async def fetch_val(self, query, values=None, column=0):
+        start = time.perf_counter()
+        try:
+            return await super().fetch_val(query, values, column)
+        finally:
+            self._observe(query, start)
+
+    async def execute(self, query, values=None):
+        start = time.perf_counter()
+        try:
+            return await super().execute(query, values)
+        finally:
+            self._observe(query, start)
+
+    async def execute_many(self, query, values):
+        """Run ``query`` once for each of ``values``, returns how many rows changed
+
+        databases runs these one by one, this hands them all to sqlite's ``executemany``.
+        It uses the task's connection so it's part of any transaction that's open
+        """
+        start = time.perf_counter()
+        try:
+            async with self.connection() as conn:
+                cursor = await conn.raw_connection.executemany(query, values)
+                return cursor.rowcount
+        finally:
+            self._observe(query, start)
+
+
+class Storage:
+    """The bot's SQLite database
+
+    Every manager shares the one database file in WAL mode. Writes go through
+    :attr:`writer` and reads through :attr:`reader`, whose connections are read only,
+    so reads don't wait behind a write that's being committed
+    """
+
+    filename: str = "yesbot.db"
+
+    def __init__(
+        self,
+        datapath: pathlib.Path,
+        loop: asyncio.AbstractEventLoop = None,
+        *,
+        metrics: MetricsRegistry = None,
+    ):
+        self.loop = loop or asyncio.get_event_loop()
+        self.datapath = datapath
+        self.path = datapath / self.filename
+        url = f"sqlite:///{self.path}"
+        self.writer = _TimedDatabase(url, metrics=metrics, factory=_WriteConnection)
+        self.reader = _TimedDatabase(url, metrics=metrics, factory=_ReadConnection)
+        self.coherence = CacheCoherence(self.reader, self.writer, loop=self.loop)
+        self._connected = asyncio.Event()
+        self._error: Optional[BaseException] = None
+
+    async def connect(self) -> None:
+        self._error = None
+        try:
+            self.datapath.mkdir(parents=True, exist_ok=True)
+            await self.loop.run_in_executor(None, self._prepare)
+            await self.writer.connect()
+            await self.reader.connect()
+            await self.coherence.start()
+        except BaseException as e:
+            # Wake up anything waiting for the database so it fails instead of hanging
+            self._error = e
+            self._connected.set()
+            raise
+        self._connected.set()
+
+    async def wait_until_connected(self) -> None:
+        """Wait for :meth:`connect` to finish, raises ``RuntimeError`` if it failed"""
+        await self._connected.wait()
+        if self._error is not None:
+            raise RuntimeError("Couldn't connect to the database") from self._error
+
+    async def close(self) -> None:
+        self._connected.clear()
+        self.coherence.close()
+        await self.reader.disconnect()
+        await self.writer.disconnect()
+
+    def _prepare(self) -> None:
+        """Bring the schema up to date and pull in any old database files
+
+        Journal mode is stored in the file so this also switches it to WAL before
+        any of the pooled connections open it
+        """
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            version = migrations.run_migrations(conn)
+            log.info("Database schema is at version %s", version)
+            self._migrate_legacy_files(conn)
+            for query, plan in migrations.find_table_scans(conn):
+                log.warning("Query is not using an index: %s\n%s", query, "\n".join(plan))
+        finally:
+            conn.close()
+
+    def _migrate_legacy_files(self, conn: sqlite3.Connection) -> None:
+        """Copy the data from the old per-manager database files into this one
+
+        Each old file is renamed to ``<name>.migrated`` once it's been copied so this
+        only ever happens once
+        """
+        for name, table, columns in LEGACY_FILES:
+            path = self.datapath / name
+            if not path.exists():
+                continue
+            log.info("Migrating %s into %s", path.name, self.filename)
+            conn.execute("ATTACH DATABASE ? AS legacy", (str(path),))
+            try:
+                conn.execute("BEGIN")
+                conn.execute(
+                    f"INSERT OR IGNORE INTO main.{table} ({columns}) "
+                    f"SELECT {columns} FROM legacy.{table}"
+                )
+                conn.execute("COMMIT")
+            except sqlite3.OperationalError as e:
+                conn.execute("ROLLBACK")
+                log.exception("Could not migrate %s", path.name, exc_info=e)
+                continue
+            finally:
+                conn.execute("DETACH DATABASE legacy")
+            path.rename(path.with_name(f"{path.name}.migrated"))
@@ -0,0 +1,174 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import re
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+__all__ = ["Template", "TemplateError", "compile_template"]
+
+_TOKEN = re.compile(r"\{\{|\}\}|\{([^{}]*)\}")
+# What each variable can be asked for and what it shows by itself. This is an allow
+# list on purpose, tags are written by anyone and `{user._state.http.token}` is a thing
+_ATTRS: Dict[str, Tuple[str, frozenset]] = {
+    "user": (
+        "display_name",
+        frozenset({"id", "name", "display_name", "mention", "discriminator"}),
+    ),
+    "guild": ("name", frozenset({"id", "name", "member_count"})),
+    "channel": ("mention", frozenset({"id", "name", "mention"})),
+}
+
+Env = Dict[str, Any]
+Getter = Callable[[Env], str]
+Part = Union[str, Getter, "_Cond"]
+
+
+class TemplateError(ValueError):
+    """The template's conditionals are broken"""
+
+
+class _Cond:
+    __slots__ = ("test", "then", "otherwise")
+
+    def __init__(self, test: Getter):
+        self.test = test
+        self.then: List[Part] = []
+        self.otherwise: List[Part] = []
+
+
+def _args_getter(index: Optional[int]) -> Getter:
+    if index is None:
+        return lambda env: env["args"]
+
+    def get(env: Env) -> str:
+        words = env.get("words")
+        if words is None:
+            words = env["words"] = env["args"].split()
+        return words[index] if index < len(words) else ""
+
+    return get
+
+
+def _attr_getter(root: str, attr: str) -> Getter:
+    def get(env: Env) -> str:
+        obj = env.get(root)
+        return "" if obj is None else str(getattr(obj, attr))
+
+    return get
+
+
+def _getter(expr: str) -> Optional[Getter]:
+    root, _, attr = expr.partition(".")
+    if root == "args":
+        if not attr:
+            return _args_getter(None)
+        elif attr.isdigit() and int(attr) > 0:
+            return _args_getter(int(attr) - 1)  # {args.1} is the first word
+        return None
+    elif root not in _ATTRS:
+        return None
+    default, allowed = _ATTRS[root]
+    if attr and attr not in allowed:
+        return None
+    return _attr_getter(root, attr or default)
+
+
+class Template:
+    """A tag response compiled into a list of literals, variables and conditionals
+
+    Compiling does all of the parsing so :meth:`render` is one pass over the parts.
+    Anything in braces which isn't a known variable is left as it was written, and
+    ``{{`` and ``}}`` are literal braces
+    """
+
+    __slots__ = ("source", "parts")
+
+    def __init__(self, source: str, parts: List[Part]):
+        self.source = source
+        self.parts = parts
+
+    def render(
+        self, *, user: Any = None, guild: Any = None, channel: Any = None, args: str = ""
+    ) -> str:
+        out: List[str] = []
+        env = {"user": user, "guild": guild, "channel": channel, "args": args}
+        self._render(self.parts, env, out)
+        return "".join(out)
+
+    @classmethod
+    def _render(cls, parts: List[Part], env: Env, out: List[str]) -> None:
+        for part in parts:
+            if part.__class__ is str:
+                out.append(part)
+            elif part.__class__ is _Cond:
+                cls._render(part.then if part.test(env) else part.otherwise, env, out)
+            else:
+                out.append(part(env))
+
+
+def compile_template(source: str) -> Optional[Template]:
+    """Compile a tag response, or return ``None`` if it has nothing to substitute"""
+    if "{" not in source and "}" not in source:
+        return None
+    root: List[Part] = []
+    # Each open {if} along with whether it's in its {else} branch yet
+    stack: List[Tuple[_Cond, bool]] = []
+    target = root
+    literal: List[str] = []
+    dynamic = False
+    pos = 0
+
+    def flush() -> None:
+        if literal:
+            target.append("".join(literal))
+            literal.clear()
+
+    for match in _TOKEN.finditer(source):
+        literal.append(source[pos : match.start()])
+        pos = match.end()
+        token = match.group()
+        if token in ("{{", "}}"):
+            literal.append(token[0])
+            dynamic = True
+            continue
+        expr = match.group(1).strip()
+        keyword, _, rest = expr.partition(" ")
+        if keyword == "if":
+            if (test := _getter(rest.strip())) is None:
+                raise TemplateError(f"{{{expr}}} isn't something I can check")
+            flush()
+            cond = _Cond(test)
+            target.append(cond)
+            stack.append((cond, False))
+            target = cond.then
+        elif expr == "else":
+            if not stack or stack[-1][1]:
+                raise TemplateError("{else} without an {if}")
+            flush()
+            cond, _ = stack.pop()
+            stack.append((cond, True))
+            target = cond.otherwise
+        elif expr == "end":
+            if not stack:
+                raise TemplateError("{end} without an {if}")
+            flush()
+            stack.pop()
+            if not stack:
+                target = root
+            else:
+                cond, in_else = stack[-1]
+                target = cond.otherwise if in_else else cond.then
+        elif (getter := _getter(expr)) is not None:
+            flush()
+            target.append(getter)
+        else:
+            literal.append(token)
+            continue
+        dynamic = True
+    if stack:
+        raise TemplateError("{if} without an {end}")
+    literal.append(source[pos:])
+    flush()
+    return Template(source, root) if dynamic else None
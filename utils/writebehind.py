@@ -0,0 +1,98 @@
+# Copyright (c) 2021 - Jojo#7791
+# Licensed under MIT
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+from databases import Database
+
+log = logging.getLogger("writebehind")
+__all__ = ["WriteBehind"]
+
+
+class WriteBehind:
+    """Buffers writes to a database and flushes them in batches
+
+    Writes are keyed, so a later write to the same key replaces a pending one (deleting
+    a tag that hasn't been flushed yet only costs the delete). Pending writes are
+    flushed every ``interval`` seconds, as soon as ``max_pending`` are queued, or when
+    :meth:`close` is called. Each flush is one transaction with one ``executemany``
+    per statement
+    """
+
+    def __init__(
+        self,
+        db: Database,
+        *,
+        interval: float = 1.0,
+        max_pending: int = 500,
+        loop: asyncio.AbstractEventLoop = None,
+    ):
+        self.db = db
+        self.interval = interval
+        self.max_pending = max_pending
+        self.loop = loop or asyncio.get_event_loop()
+        self._pending: Dict[Hashable, Tuple[str, Dict[str, Any]]] = {}
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._closing = False
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._closing = False
+            self._task = self.loop.create_task(self._run())
+
+    def put(self, key: Hashable, query: str, values: Dict[str, Any]) -> None:
+        """Queue a write, replacing any pending write with the same key"""
+        self._pending.pop(key, None)  # Keep the queue in the order of the latest writes
+        self._pending[key] = (query, values)
+        if len(self._pending) >= self.max_pending:
+            self._wakeup.set()
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                log.exception("Failed to flush pending writes", exc_info=e)
+
+    async def flush(self) -> None:
+        async with self._lock:
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            batches: Dict[str, List[Dict[str, Any]]] = {}
+            for query, values in pending.values():
+                batches.setdefault(query, []).append(values)
+            try:
+                async with self.db.transaction():
+                    for query, values in batches.items():
+                        await self.db.execute_many(query, values)
+            except BaseException:
+                # Put them back unless they've been written again in the meantime,
+                # this includes being cancelled half way through
+                for key, write in pending.items():
+                    self._pending.setdefault(key, write)
+                raise
+
+    async def close(self) -> None:
+        if self._task is not None:
+            # Cancelling could land in the middle of a flush, so the loop is woken up
+            # to do its last flush and left to finish on its own
+            self._closing = True
+            self._wakeup.set()
+            await self._task
+            self._task = None
+        await self.flush()